@@ -9,6 +9,40 @@ import json
 import re
 import sys
 
+try:
+    import orjson
+except ImportError:
+    # orjson is not available in every Python distribution used by the build,
+    # fall back to the (slower) standard library implementation.
+    orjson = None
+
+# Characters that give a --cut_after pattern regex semantics.
+_REGEX_METACHARACTERS = re.compile(r"[.^$*+?{}\[\]\\|()]")
+
+
+def _compile_cut_pattern(cut_after):
+    """Compiles a --cut_after pattern.
+
+    Patterns without regex metacharacters are returned unchanged and later
+    matched literally with `str.find`, which avoids the regex engine.
+    """
+    if _REGEX_METACHARACTERS.search(cut_after):
+        return re.compile(cut_after)
+    return cut_after
+
+
+def _find_cut_end(pattern, text):
+    """Returns the index right after the first match of `pattern` in `text`.
+
+    `pattern` is a value returned by `_compile_cut_pattern`. Returns None if
+    there is no match.
+    """
+    if isinstance(pattern, str):
+        index = text.find(pattern)
+        return index + len(pattern) if index >= 0 else None
+    match = pattern.search(text)
+    return match.end() if match else None
+
 
 def main():
     parser = argparse.ArgumentParser()
@@ -19,26 +53,30 @@ def main():
     parser.add_argument("--exit_on_failure", default=False)
     args = parser.parse_args()
 
-    with open(args.input, "r") as spdx:
-        data = json.load(spdx)
+    with open(args.input, "rb") as spdx:
+        content = spdx.read()
+    data = orjson.loads(content) if orjson else json.loads(content)
 
-    found_segment = False
-    error_msg = "Did not find licenseID {} in spdx file {}.".format(
-        args.license_id, args.input
-    )
+    # Index the extracted licenses by id, keeping the first occurrence.
+    licenses_by_id = {}
     for d in data["hasExtractedLicensingInfos"]:
-        if d["licenseId"] == args.license_id:
-            error_msg = (
-                "Did not find string pattern {} in license text.".format(
-                    args.cut_after
-                )
-            )
-            text = d["extractedText"]
-            match = re.search(args.cut_after, text)
-            if match:
-                d["extractedText"] = text[: match.end()]
-                found_segment = True
-            break
+        licenses_by_id.setdefault(d["licenseId"], d)
+
+    found_segment = False
+    d = licenses_by_id.get(args.license_id)
+    if d is None:
+        error_msg = "Did not find licenseID {} in spdx file {}.".format(
+            args.license_id, args.input
+        )
+    else:
+        error_msg = "Did not find string pattern {} in license text.".format(
+            args.cut_after
+        )
+        text = d["extractedText"]
+        end = _find_cut_end(_compile_cut_pattern(args.cut_after), text)
+        if end is not None:
+            d["extractedText"] = text[:end]
+            found_segment = True
 
     if not found_segment:
         if args.exit_on_failure:
@@ -61,23 +61,23 @@ class FuchsiaTaskRunTestComponent(FuchsiaTask):
             else args.url
         )
 
+        command = [
+            *ffx,
+            "test",
+            "run",
+            *(["--realm", args.realm] if args.realm else []),
+            url,
+            "--",
+            *remainder_args,
+        ]
+
         try:
             print(
                 Terminal.info(
                     f"Forwarding unrecognized args to test: {remainder_args}"
                 )
             )
-            subprocess.check_call(
-                [
-                    *ffx,
-                    "test",
-                    "run",
-                    *(["--realm", args.realm] if args.realm else []),
-                    url,
-                    "--",
-                    *remainder_args,
-                ]
-            )
+            subprocess.check_call(command)
         except subprocess.CalledProcessError as e:
             if e.returncode != 1:
                 raise e
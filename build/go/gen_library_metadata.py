@@ -7,49 +7,81 @@ import argparse
 import json
 import os
 import sys
+from pathlib import Path
+
+try:
+    import orjson
+except ImportError:
+    # orjson is not available in every Python distribution used by the build,
+    # fall back to the (slower) standard library implementation.
+    orjson = None
 
 FUCHSIA_MODULE = "go.fuchsia.dev/fuchsia"
 
 
-class Source(object):
-    def __init__(self, name, path, file):
-        self.name = name
-        self.path = path
-        self.file = file
+def _load_json(path):
+    """Parses the JSON file at `path`, using orjson when it is available."""
+    with open(path, "rb") as f:
+        content = f.read()
+    if orjson:
+        return orjson.loads(content)
+    return json.loads(content)
 
-    def __str__(self):
-        return "%s[%s]" % (self.name, self.path)
 
-    def __hash__(self):
-        return hash((self.name, self.path))
+def _dump_json(data, path):
+    """Writes `data` to `path` as indented JSON with sorted keys.
 
-    def __eq__(self, other):
-        return self.name == other.name and self.path == other.path
+    orjson is used when it is available, unless its output contains
+    non-ASCII characters: orjson cannot escape them, and the output must
+    match json.dump()'s default ASCII-only format.
+    """
+    if orjson:
+        content = orjson.dumps(
+            data, option=orjson.OPT_INDENT_2 | orjson.OPT_SORT_KEYS
+        )
+        if content.isascii():
+            with open(path, "wb") as f:
+                f.write(content)
+            return
+    with open(path, "w") as f:
+        json.dump(data, f, indent=2, sort_keys=True)
 
 
 def get_sources(dep_files, extra_sources=None):
-    # Aggregate source data from dependencies.
-    sources = set()
-    if extra_sources:
-        sources.update(extra_sources)
+    """Aggregates Go sources from dependencies.
+
+    Args:
+      dep_files: paths to library metadata files of dependencies.
+      extra_sources: optional iterable of (name, path, file) tuples, where
+        `file` is the metadata file the source is attributed to.
+
+    Returns:
+      A dict mapping source names to paths.
+    """
+    # Aggregate source data from dependencies. Sources are deduplicated by
+    # (name, path), and remember the first file that declared them.
+    sources = {}
+    for name, path, file in extra_sources or ():
+        sources.setdefault((name, path), file)
+    # The same names and paths recur across many dependency files, intern
+    # them so that duplicates share a single string object.
     for dep in dep_files:
-        with open(dep, "r") as dep_file:
-            for name, path in json.load(dep_file)["sources"].items():
-                sources.add(Source(name, path, dep))
+        for name, path in _load_json(dep)["sources"].items():
+            sources.setdefault((sys.intern(name), sys.intern(path)), dep)
 
     # Verify duplicates.
     sources_by_name = {}
-    for src in sources:
-        sources_by_name.setdefault(src.name, []).append(src)
+    for (name, path), file in sources.items():
+        sources_by_name.setdefault(name, []).append((path, file))
     for name, srcs in sources_by_name.items():
         if len(srcs) <= 1:
             continue
         print('Error: source "%s" has multiple paths.' % name)
-        for src in srcs:
-            print(" - %s (%s)" % (src.path, src.file))
+        for path, file in srcs:
+            print(" - %s (%s)" % (path, file))
         raise Exception("Could not aggregate sources")
 
-    return {s.name: s.path for s in sources}
+    return {name: path for name, path in sources}
 
 
 def main():
@@ -92,17 +124,20 @@ def main():
             name = name_file.read()
 
     build_dir = os.path.abspath(args.root_build_dir)
+    abs_source_dir = os.path.abspath(args.source_dir)
 
     # Find source_root from library source_dir, i.e. do not assume
     # that the build directory is two levels down the source root
     if args.fuchsia_source_dir:
         source_root = args.fuchsia_source_dir
     else:
-        source_root = build_dir
-        while not os.path.exists(os.path.join(source_root, ".jiri_manifest")):
-            source_root = os.path.dirname(source_root)
-            if source_root in ("", "/"):
-                parser.error("Cannot find Fuchsia source directory!")
+        build_path = Path(build_dir)
+        for candidate in (build_path, *build_path.parents):
+            if (candidate / ".jiri_manifest").exists():
+                source_root = str(candidate)
+                break
+        else:
+            parser.error("Cannot find Fuchsia source directory!")
 
     third_party_dir = os.path.join(source_root, "third_party")
 
@@ -112,9 +147,9 @@ def main():
     # TODO(olivernewman): Stop exempting package names that don't start with
     # `FUCHSIA_MODULE`; all packages should use absolute names that start with
     # the module name.
-    if name.startswith(FUCHSIA_MODULE) and not os.path.abspath(
-        args.source_dir
-    ).startswith((build_dir, third_party_dir)):
+    if name.startswith(FUCHSIA_MODULE) and not abs_source_dir.startswith(
+        (build_dir, third_party_dir)
+    ):
         expected_name = (
             FUCHSIA_MODULE
             + "/"
@@ -128,43 +163,50 @@ def main():
                 f"got {name!r}, expected {expected_name!r}"
             )
 
+    # Joining with "" appends a separator only when needed, so each source
+    # path below is a plain concatenation equivalent to os.path.join().
+    source_dir_prefix = os.path.join(args.source_dir, "")
+    name_prefix = os.path.join(name, "")
     current_sources = []
     for source in args.sources:
-        p = os.path.join(args.source_dir, source)
+        p = source_dir_prefix + source
         # Explicit sources must be files.
         if not os.path.isfile(p):
             raise ValueError(f"Source {p} is not a file")
-        current_sources.append(
-            Source(os.path.join(name, source), p, args.output)
-        )
+        current_sources.append((name_prefix + source, p, args.output))
     if not name.endswith("/..."):
         # Get the common subdirectory of all sources, which is necessary to
         # determine the Go package name for these sources.
-        dirs = set(
-            os.path.dirname(src) for src in args.sources if src.endswith(".go")
-        )
-        if len(dirs) > 1:
-            raise ValueError(
-                f"Sources are from multiple directories {dirs}, "
-                f"this is not supported by go_library"
-            )
-        subdir = list(dirs)[0]
+        subdir = None
+        go_sources = set()
+        for src in args.sources:
+            if not src.endswith(".go"):
+                continue
+            src_dir = os.path.dirname(src)
+            if subdir is None:
+                subdir = src_dir
+            elif src_dir != subdir:
+                raise ValueError(
+                    f"Sources are from multiple directories "
+                    f"{{{subdir!r}, {src_dir!r}}}, "
+                    f"this is not supported by go_library"
+                )
+            go_sources.add(os.path.basename(src))
+        if subdir is None:
+            raise ValueError(f"go_library {name} has no Go sources")
         name = os.path.join(name, subdir)
         source_dir = os.path.join(args.source_dir, subdir)
 
-        go_sources = {
-            os.path.basename(f) for f in args.sources if f.endswith(".go")
-        }
-
         # Require all non-generated Go files to be listed as sources.
-        if not os.path.abspath(source_dir).startswith(build_dir):
-            # TODO: Use `glob.glob("*.go", root_dir=source_dir)`
-            # instead of os.listdir after upgrading to Python 3.10.
-            go_files = {
-                f
-                for f in os.listdir(source_dir)
-                if f.endswith(".go") and not f.endswith("_test.go")
-            }
+        abs_subdir = os.path.normpath(os.path.join(abs_source_dir, subdir))
+        if not abs_subdir.startswith(build_dir):
+            with os.scandir(source_dir) as entries:
+                go_files = {
+                    e.name
+                    for e in entries
+                    if e.name.endswith(".go")
+                    and not e.name.endswith("_test.go")
+                }
             missing = go_files - go_sources
             if missing:
                 raise ValueError(
@@ -174,16 +216,7 @@ def main():
                     f' {", ".join(sorted(missing))}'
                 )
     result = get_sources(args.deps, extra_sources=current_sources)
-    with open(args.output, "w") as output_file:
-        json.dump(
-            {
-                "package": name,
-                "sources": result,
-            },
-            output_file,
-            indent=2,
-            sort_keys=True,
-        )
+    _dump_json({"package": name, "sources": result}, args.output)
 
 
 if __name__ == "__main__":
@@ -71,11 +71,13 @@ _RECLIENT_ERROR_STATUS = 35
 _RBE_SERVER_ERROR_STATUS = 45
 _RBE_KILLED_STATUS = 137
 
-_RETRIABLE_REWRAPPER_STATUSES = {
-    _RECLIENT_ERROR_STATUS,
-    _RBE_SERVER_ERROR_STATUS,
-    _RBE_KILLED_STATUS,
-}
+_RETRIABLE_REWRAPPER_STATUSES = frozenset(
+    {
+        _RECLIENT_ERROR_STATUS,
+        _RBE_SERVER_ERROR_STATUS,
+        _RBE_KILLED_STATUS,
+    }
+)
 
 _MAX_CONCURRENT_DOWNLOADS = 4
 
@@ -106,6 +108,15 @@ def _write_lines_to_file(path: Path, lines: Iterable[str]) -> None:
     path.write_text(contents)
 
 
+def _write_executable_file(path: Path, contents: str) -> None:
+    """Writes a file that only the user can read, write, and execute."""
+    fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, stat.S_IRWXU)
+    with os.fdopen(fd, "w") as f:
+        # The mode above is subject to umask, and ignored for existing files.
+        os.fchmod(fd, stat.S_IRWXU)  # chmod u+rwx
+        f.write(contents)
+
+
 def _files_match(file1: Path, file2: Path) -> bool:
     """Compares two files, returns True if they both exist and match."""
     # filecmp.cmp does not invoke any subprocesses.
@@ -160,6 +171,13 @@ def _detail_diff_filtered(
 
 def _text_diff(file1: Path, file2: Path) -> cl_utils.SubprocessResult:
     """Capture textual differences to the result."""
+    # Identical files are common, skip spawning 'diff' for them.
+    # Let 'diff' report any errors reading the files.
+    try:
+        if _files_match(file1, file2):
+            return cl_utils.SubprocessResult(0)
+    except OSError:
+        pass
     return cl_utils.subprocess_call(
         ["diff", "-u", str(file1), str(file2)], quiet=True
     )
@@ -167,11 +185,32 @@ def _text_diff(file1: Path, file2: Path) -> cl_utils.SubprocessResult:
 
 def _files_under_dir(path: Path) -> Iterable[Path]:
     """'ls -R DIR' listing files relative to DIR."""
-    yield from (
-        Path(root, file).relative_to(path)
-        for root, unused_dirs, files in os.walk(str(path))
-        for file in files
-    )
+    yield from _scan_files_under_dir(str(path), Path())
+
+
+def _scan_files_under_dir(path: str, relpath: Path) -> Iterable[Path]:
+    """Recursive helper to _files_under_dir().
+
+    Like os.walk(), this does not descend into symlinks to directories,
+    and silently skips directories that cannot be read.  Unlike os.walk(),
+    it uses the cached file types of os.scandir() entries.
+
+    Yields:
+      paths of non-directories under `path`, prefixed with `relpath`.
+    """
+    try:
+        with os.scandir(path) as it:
+            entries = list(it)
+    except OSError:
+        return
+    subdirs = []
+    for entry in entries:
+        if entry.is_dir(follow_symlinks=False):
+            subdirs.append(entry)
+        elif not entry.is_dir():
+            yield relpath / entry.name
+    for entry in subdirs:
+        yield from _scan_files_under_dir(entry.path, relpath / entry.name)
 
 
 def _common_files_under_dirs(path1: Path, path2: Path) -> AbstractSet[Path]:
@@ -411,16 +450,16 @@ class ReproxyLogEntry(object):
     def remote_metadata(self) -> Dict[str, Any]:
         return self._raw["remote_metadata"][0]
 
-    @property
+    @functools.cached_property
     def action_digest(self) -> str:
         return self.remote_metadata["action_digest"][0].text.strip('"')
 
-    @property
+    @functools.cached_property
     def output_file_digests(self) -> Dict[Path, str]:  # path, hash/size
         d = self.remote_metadata.get("output_file_digests", dict())
         return {Path(k): v.text.strip('"') for k, v in d.items()}
 
-    @property
+    @functools.cached_property
     def output_directory_digests(self) -> Dict[Path, str]:  # path, hash/size
         d = self.remote_metadata.get("output_directory_digests", dict())
         return {Path(k): v.text.strip('"') for k, v in d.items()}
@@ -489,7 +528,7 @@ class ReproxyLogEntry(object):
     @staticmethod
     def parse_action_log(log: Path) -> "ReproxyLogEntry":
         with open(log) as f:
-            return ReproxyLogEntry._parse_lines(f.readlines())
+            return ReproxyLogEntry._parse_lines(f)
 
     @staticmethod
     def _parse_lines(lines: Iterable[str]) -> "ReproxyLogEntry":
@@ -630,6 +669,7 @@ def analyze_rbe_logs(
 
 
 _RBE_DOWNLOAD_STUB_IDENTIFIER = "# RBE download stub"
+_RBE_DOWNLOAD_STUB_IDENTIFIER_BYTES = _RBE_DOWNLOAD_STUB_IDENTIFIER.encode()
 _RBE_DOWNLOAD_STUB_HELP = "# run //build/rbe/dlwrap.py on this file to download"
 _RBE_DOWNLOAD_STUB_SUFFIX = ".dl-stub"
 
@@ -639,7 +679,8 @@ _RBE_XATTR_NAME = "user.fuchsia.rbe.digest.sha256"
 
 
 def download_stub_backup_location(path: Path) -> Path:
-    return Path(str(path) + _RBE_DOWNLOAD_STUB_SUFFIX)
+    # with_name() reuses the parsed parent, instead of re-parsing the whole path.
+    return path.with_name(path.name + _RBE_DOWNLOAD_STUB_SUFFIX)
 
 
 def get_blob_digest(path: Path) -> str:
@@ -655,12 +696,21 @@ class DownloadStubFormatError(Exception):
 
 
 def download_temp_location(dest: Path) -> Path:
-    return Path(str(dest) + ".download-tmp")
+    return dest.with_name(dest.name + ".download-tmp")
 
 
 class DownloadStubInfo(object):
     """Contains infomation about a remotely stored artifact."""
 
+    # One of these is created per remote output, so skip the per-instance dict.
+    __slots__ = (
+        "_path",
+        "_type",
+        "_blob_digest",
+        "_action_digest",
+        "_build_id",
+    )
+
     def __init__(
         self,
         path: Path,
@@ -825,10 +875,10 @@ class DownloadStubInfo(object):
         return status
 
 
-def _file_starts_with(path: Path, text: str) -> bool:
+def _file_starts_with(path: Path, prefix: bytes) -> bool:
     with open(path, "rb") as f:
         # read only a small number of bytes to compare
-        return os.pread(f.fileno(), len(text), 0) == text.encode()
+        return os.pread(f.fileno(), len(prefix), 0) == prefix
 
 
 def is_download_stub_file(path: Path) -> bool:
@@ -836,7 +886,7 @@ def is_download_stub_file(path: Path) -> bool:
     if _HAVE_XATTR:
         return _RBE_XATTR_NAME in os.listxattr(path)
     else:
-        return _file_starts_with(path, _RBE_DOWNLOAD_STUB_IDENTIFIER)
+        return _file_starts_with(path, _RBE_DOWNLOAD_STUB_IDENTIFIER_BYTES)
 
 
 def undownload(path: Path) -> bool:
@@ -1253,8 +1303,9 @@ exec "${{cmd[@]}}"
 
         yield from self._options
 
-    @property
+    @functools.cached_property
     def options(self) -> Sequence[str]:
+        # Computed once: --platform merging may read the --cfg file.
         return list(self._generate_options())
 
     @property
@@ -1921,8 +1972,7 @@ exec "${{cmd[@]}}"
         # --local-only flags seen in the original command.
         if self.local_only_flags:
             wrapper = self.local_wrapper_filename
-            wrapper.write_text(self.local_wrapper_text)
-            wrapper.chmod(stat.S_IRWXU)  # chmod u+rwx
+            _write_executable_file(wrapper, self.local_wrapper_text)
             self._cleanup_files.append(wrapper)
 
         try:
@@ -2013,6 +2063,23 @@ exec "${{cmd[@]}}"
 
         return path
 
+    @functools.cached_property
+    def _deps_relpath_starts(self) -> Sequence[Tuple[str, Path]]:
+        """(root prefix, relpath start) pairs for relativizing depfile paths.
+
+        Depfiles can list thousands of paths, so look up the local and
+        remote roots and working dirs once per action.
+        A root prefix includes a trailing separator, so that matching
+        it is equivalent to testing for the root among a path's parents.
+        """
+        return (
+            (os.path.join(self.exec_root, ""), self.working_dir),
+            (
+                os.path.join(self.remote_exec_root, ""),
+                self.remote_working_dir,
+            ),
+        )
+
     def _relativize_remote_or_local_deps(self, path: str) -> str:
         """Relativize absolute paths (in depfiles).
 
@@ -2021,12 +2088,11 @@ exec "${{cmd[@]}}"
         """
         p = Path(path)
         if p.is_absolute():
-            if self.exec_root in p.parents:
-                new_path = str(cl_utils.relpath(p, start=self.working_dir))
-            elif self.remote_exec_root in p.parents:
-                new_path = str(
-                    cl_utils.relpath(p, start=self.remote_working_dir)
-                )
+            p_str = str(p)  # normalized
+            for root_prefix, start in self._deps_relpath_starts:
+                if p_str.startswith(root_prefix):
+                    new_path = str(cl_utils.relpath(p, start=start))
+                    break
             else:
                 msg(f"Unable to relativize path: {path}")
                 return path
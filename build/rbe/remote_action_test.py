@@ -4,15 +4,26 @@
 # found in the LICENSE file.
 
 import argparse
+import atexit
 import contextlib
-import copy
 import io
 import os
+import shutil
+import stat
 import sys
 import tempfile
 import unittest
 from pathlib import Path
-from typing import Any, Collection, Dict, Sequence, Tuple
+from typing import (
+    Any,
+    Callable,
+    Collection,
+    Dict,
+    List,
+    Optional,
+    Sequence,
+    Tuple,
+)
 from unittest import mock
 
 import cl_utils
@@ -28,9 +39,30 @@ class ImmediateExit(Exception):
     """For mocking functions that do not return."""
 
 
-def _write_file_contents(path: Path, contents: str) -> None:
-    with open(path, "w") as f:
-        f.write(contents)
+def _write_file_contents(path: Path, contents: str | bytes) -> None:
+    if isinstance(contents, str):
+        contents = contents.encode()
+    Path(path).write_bytes(contents)
+
+
+# Sample text file contents, pre-encoded for _write_file_contents().
+_QUICK_BROWN_FOX = b"The quick brown fox\njumped over the lazy\ndogs.\n"
+
+
+# Scratch space shared by the tests in this module, created on first use,
+# so that each test only pays for a mkdir instead of a mkdtemp and rmtree.
+_SHARED_TD: Optional[tempfile.TemporaryDirectory] = None
+
+
+def _scratch_dir(test_id: str) -> Path:
+    """Returns a new empty directory for the test identified by test_id."""
+    global _SHARED_TD
+    if _SHARED_TD is None:
+        _SHARED_TD = tempfile.TemporaryDirectory()
+        atexit.register(_SHARED_TD.cleanup)
+    d = Path(_SHARED_TD.name) / test_id
+    d.mkdir()
+    return d
 
 
 def _read_file_contents(path: Path) -> str:
@@ -39,19 +71,58 @@ def _read_file_contents(path: Path) -> str:
 
 
 def _strs(items: Sequence[Any]) -> Sequence[str]:
-    return [str(i) for i in items]
+    return list(map(str, items))
 
 
-def _paths(items: Collection[Any]) -> Collection[Path]:
-    if isinstance(items, list):
-        return [Path(i) for i in items]
-    elif isinstance(items, set):
-        return {Path(i) for i in items}
-    elif isinstance(items, tuple):
-        return tuple(Path(i) for i in items)
+_PATHS_CONSTRUCTORS: Dict[
+    type, Callable[[Collection[Any]], Collection[Path]]
+] = {
+    list: lambda items: [Path(i) for i in items],
+    set: lambda items: {Path(i) for i in items},
+    tuple: lambda items: tuple(Path(i) for i in items),
+}
 
+
+def _paths(items: Collection[Any]) -> Collection[Path]:
     t = type(items)
-    raise TypeError(f"Unhandled sequence type: {t}")
+    try:
+        convert = _PATHS_CONSTRUCTORS[t]
+    except KeyError:
+        raise TypeError(f"Unhandled sequence type: {t}")
+    return convert(items)
+
+
+class _PatchingTestCase(unittest.TestCase):
+    """Base class for tests that patch attributes for a whole test.
+
+    Patches are undone when the test finishes.
+    """
+
+    def _patch_mock(self, *args: Any, **kwargs: Any) -> mock.MagicMock:
+        # Like mock.patch.object(), but undone at cleanup instead of at
+        # the end of a with-block, so tests need not nest.
+        patcher = mock.patch.object(*args, **kwargs)
+        self.addCleanup(patcher.stop)
+        return patcher.start()
+
+
+# A single RemoteTool shared by all tests.  It is never used to run
+# remotetool: tests replace the methods that would do so.
+def _fake_downloader() -> remotetool.RemoteTool:
+    return remotetool.RemoteTool(
+        reproxy_cfg={
+            "service": "foo.buildservice:443",
+            "instance": "my-project/remote/instances/default",
+        }
+    )
+
+
+_FAKE_DOWNLOADER = _fake_downloader()
+
+# Results returned by the _fake_download_* functions.  These are shared,
+# so callers must not modify them.
+_DOWNLOAD_OK = cl_utils.SubprocessResult(0)
+_DOWNLOAD_FAILED = cl_utils.SubprocessResult(1)
 
 
 def _fake_download_output(
@@ -66,7 +137,7 @@ def _fake_download_output(
     # defined because multiprocessing cannot serialize mocks
     stub_info, downloader, working_dir_abs, verbose = packed_args
     # Don't actually try to download.
-    return (stub_info.path, cl_utils.SubprocessResult(0))
+    return (stub_info.path, _DOWNLOAD_OK)
 
 
 def _fake_download_output_fail(
@@ -81,7 +152,7 @@ def _fake_download_output_fail(
     # defined because multiprocessing cannot serialize mocks
     stub_info, downloader, working_dir_abs, verbose = packed_args
     # Don't actually try to download.
-    return (stub_info.path, cl_utils.SubprocessResult(1))
+    return (stub_info.path, _DOWNLOAD_FAILED)
 
 
 def _fake_download_input(
@@ -96,7 +167,7 @@ def _fake_download_input(
     # defined because multiprocessing cannot serialize mocks
     stub_path, downloader, working_dir_abs, verbose = packed_args
     # Don't actually try to download.
-    return (stub_path, cl_utils.SubprocessResult(0))
+    return (stub_path, _DOWNLOAD_OK)
 
 
 def _fake_download_input_fail(
@@ -111,10 +182,10 @@ def _fake_download_input_fail(
     # defined because multiprocessing cannot serialize mocks
     stub_path, downloader, working_dir_abs, verbose = packed_args
     # Don't actually try to download.
-    return (stub_path, cl_utils.SubprocessResult(1))
+    return (stub_path, _DOWNLOAD_FAILED)
 
 
-class PathToDownloadStubTests(unittest.TestCase):
+class PathToDownloadStubTests(_PatchingTestCase):
     def test_is_stub(self) -> None:
         path = Path("obj/stubby.stub")
         fake_stub_info = remote_action.DownloadStubInfo(
@@ -124,114 +195,110 @@ class PathToDownloadStubTests(unittest.TestCase):
             action_digest="bed977abaac/32",
             build_id="random-id0348718",
         )
-        with mock.patch.object(
+        check_stub = self._patch_mock(
             remote_action, "is_download_stub_file", return_value=True
-        ) as mock_check_stub:
-            with mock.patch.object(
-                remote_action.DownloadStubInfo,
-                "read_from_file",
-                return_value=fake_stub_info,
-            ) as mock_read_stub:
-                stub = remote_action.path_to_download_stub(path)
+        )
+        read_stub = self._patch_mock(
+            remote_action.DownloadStubInfo,
+            "read_from_file",
+            return_value=fake_stub_info,
+        )
+        stub = remote_action.path_to_download_stub(path)
         self.assertEqual(stub, fake_stub_info)
-        mock_check_stub.assert_called_once_with(path)
-        mock_read_stub.assert_called_once_with(path)
+        check_stub.assert_called_once_with(path)
+        read_stub.assert_called_once_with(path)
 
     def test_not_stub(self) -> None:
         path = Path("not/stubby.o")
-        with mock.patch.object(
+        check_stub = self._patch_mock(
             remote_action, "is_download_stub_file", return_value=False
-        ) as mock_check_stub:
-            stub = remote_action.path_to_download_stub(path)
+        )
+        stub = remote_action.path_to_download_stub(path)
 
         self.assertIsNone(stub)
-        mock_check_stub.assert_called_once_with(path)
+        check_stub.assert_called_once_with(path)
 
 
-class DownloadFileToPathTests(unittest.TestCase):
+class DownloadFileToPathTests(_PatchingTestCase):
     def test_download(self) -> None:
-        curdir = Path(os.curdir)
-        with mock.patch.object(
+        td = _scratch_dir(self.id())
+        path = td / "foo/bar/baz.tar.gz"
+        download = self._patch_mock(
             remote_action.DownloadStubInfo,
             "download",
             return_value=cl_utils.SubprocessResult(0),
-        ) as mock_download:
-            with mock.patch.object(Path, "mkdir") as mock_mkdir:
-                dl_result = remote_action.download_file_to_path(
-                    downloader=_FAKE_DOWNLOADER,
-                    working_dir_abs=curdir,  # doesn't matter for test
-                    path=Path("foo/bar/baz.tar.gz"),
-                    blob_digest="9aef862bc883270071/434",
-                    action_digest="91827319823a/41",
-                )
+        )
+        dl_result = remote_action.download_file_to_path(
+            downloader=_FAKE_DOWNLOADER,
+            working_dir_abs=td,
+            path=path,
+            blob_digest="9aef862bc883270071/434",
+            action_digest="91827319823a/41",
+        )
         self.assertEqual(dl_result.returncode, 0)
-        mock_download.assert_called_once_with(
-            downloader=_FAKE_DOWNLOADER, working_dir_abs=curdir
+        download.assert_called_once_with(
+            downloader=_FAKE_DOWNLOADER, working_dir_abs=td
         )
-        mock_mkdir.assert_called_once_with(parents=True, exist_ok=True)
+        # The destination's parent directory is created for the download.
+        self.assertTrue(path.parent.is_dir())
 
 
-class DownloadFromStubPathTests(unittest.TestCase):
+class DownloadFromStubPathTests(_PatchingTestCase):
     def test_stub_does_not_exist_ignored(self) -> None:
-        with tempfile.TemporaryDirectory() as td:
-            stub_path = Path(td) / "stub-not-exist"
-            with mock.patch.object(
-                Path, "exists", return_value=False
-            ) as mock_exists:
-                subprocess_result = remote_action.download_from_stub_path(
-                    stub_path,
-                    downloader=_FAKE_DOWNLOADER,
-                    working_dir_abs=Path(td),
-                )
+        td = _scratch_dir(self.id())
+        stub_path = td / "stub-not-exist"
+        subprocess_result = remote_action.download_from_stub_path(
+            stub_path,
+            downloader=_FAKE_DOWNLOADER,
+            working_dir_abs=td,
+        )
         self.assertEqual(subprocess_result.returncode, 0)
 
     def test_stub_using_invoked_path(self) -> None:
-        with tempfile.TemporaryDirectory() as td:
-            tdp = Path(td)
-            stub_path = tdp / "foo.exe"
-            stub_info = remote_action.DownloadStubInfo(
-                path=Path("some/where/else"),
-                type="file",
-                blob_digest="8712fed1/44",
-                action_digest="098761/145",
-                build_id="do-not-care",
-            )
-            stub_info.create(
-                working_dir_abs=tdp,
-                dest=stub_path,
-            )
-            with mock.patch.object(
-                remote_action.DownloadStubInfo,
-                "download",
-                return_value=cl_utils.SubprocessResult(0),
-            ) as mock_download:
-                subprocess_result = remote_action.download_from_stub_path(
-                    stub_path,
-                    downloader=_FAKE_DOWNLOADER,
-                    working_dir_abs=Path(td),
-                )
-            # Ensure that we use the invoked path,
-            # and not the path that is inside the stub_info.
-            mock_download.assert_called_once_with(
-                downloader=_FAKE_DOWNLOADER,
-                working_dir_abs=tdp,
-                dest=stub_path,
-            )
+        td = _scratch_dir(self.id())
+        stub_path = td / "foo.exe"
+        stub_info = remote_action.DownloadStubInfo(
+            path=Path("some/where/else"),
+            type="file",
+            blob_digest="8712fed1/44",
+            action_digest="098761/145",
+            build_id="do-not-care",
+        )
+        stub_info.create(
+            working_dir_abs=td,
+            dest=stub_path,
+        )
+        download = self._patch_mock(
+            remote_action.DownloadStubInfo,
+            "download",
+            return_value=cl_utils.SubprocessResult(0),
+        )
+        subprocess_result = remote_action.download_from_stub_path(
+            stub_path,
+            downloader=_FAKE_DOWNLOADER,
+            working_dir_abs=td,
+        )
+        # Ensure that we use the invoked path,
+        # and not the path that is inside the stub_info.
+        download.assert_called_once_with(
+            downloader=_FAKE_DOWNLOADER,
+            working_dir_abs=td,
+            dest=stub_path,
+        )
         self.assertEqual(subprocess_result.returncode, 0)
 
 
-class UndownloadTests(unittest.TestCase):
+class UndownloadTests(_PatchingTestCase):
     def test_undownload_non_stub_ignored(self) -> None:
         path = Path("foo/barf.baz")
-        with tempfile.TemporaryDirectory() as td:
-            tdp = Path(td)
-            (tdp / path.parent).mkdir(parents=True)
-            (tdp / path).write_text("bye\n")
-            # path points to a non-stub
-            self.assertFalse(remote_action.is_download_stub_file(tdp / path))
-            remote_action.undownload(tdp / path)
-            # nothing changes
-            self.assertFalse(remote_action.is_download_stub_file(tdp / path))
+        td = _scratch_dir(self.id())
+        (td / path.parent).mkdir(parents=True)
+        (td / path).write_text("bye\n")
+        # path points to a non-stub
+        self.assertFalse(remote_action.is_download_stub_file(td / path))
+        remote_action.undownload(td / path)
+        # nothing changes
+        self.assertFalse(remote_action.is_download_stub_file(td / path))
 
     def test_undownload_restored(self) -> None:
         path = Path("foo/barf.baz")
@@ -242,44 +309,47 @@ class UndownloadTests(unittest.TestCase):
             action_digest="2332df093d1/98",
             build_id="random-id777",
         )
-        with tempfile.TemporaryDirectory() as td:
-            tdp = Path(td)
-            stub.create(tdp)
-            # Pretend to download first.
-            download_status = 0
+        td = _scratch_dir(self.id())
+        stub.create(td)
+        # Pretend to download first.
+        download_status = 0
 
-            def fake_download_file(
-                downloader_self: object, path: Path, digest: str, **kwargs: Any
-            ) -> cl_utils.SubprocessResult:
-                path.write_text("greetings\n")
-                return cl_utils.SubprocessResult(download_status)
+        def fake_download_file(
+            downloader_self: object, path: Path, digest: str, **kwargs: Any
+        ) -> cl_utils.SubprocessResult:
+            path.write_text("greetings\n")
+            return cl_utils.SubprocessResult(download_status)
 
-            with mock.patch.object(
-                remotetool.RemoteTool, "download_blob", new=fake_download_file
-            ) as mock_download:
-                status = stub.download(
-                    downloader=_FAKE_DOWNLOADER, working_dir_abs=tdp
-                )
+        self._patch_mock(
+            remotetool.RemoteTool, "download_blob", new=fake_download_file
+        )
+        status = stub.download(downloader=_FAKE_DOWNLOADER, working_dir_abs=td)
+
+        # path points to a non-stub
+        self.assertFalse(remote_action.is_download_stub_file(td / path))
+
+        remote_action.undownload(td / path)
+        # now path points to a restored stub
+        self.assertTrue(remote_action.is_download_stub_file(td / path))
 
-            # path points to a non-stub
-            self.assertFalse(remote_action.is_download_stub_file(tdp / path))
 
-            remote_action.undownload(tdp / path)
-            # now path points to a restored stub
-            self.assertTrue(remote_action.is_download_stub_file(tdp / path))
+# Paths shared by the batch download tests.  Path objects are immutable.
+_CURDIR = Path(".")
+_FOO_BAR_O = Path("foo/bar.o")
+_BAZ_QUUX_O = Path("baz/quux.o")
 
 
-class DownloadOutputStubInfosBatchTests(unittest.TestCase):
+class DownloadOutputStubInfosBatchTests(_PatchingTestCase):
     def test_empty_list(self) -> None:
         statuses = remote_action.download_output_stub_infos_batch(
             downloader=_FAKE_DOWNLOADER,
             stub_infos=[],
-            working_dir_abs=Path("."),
+            working_dir_abs=_CURDIR,
         )
         self.assertEqual(statuses, {})
 
     def test_one_download_stub_downloaded_success(self) -> None:
-        path = Path("foo/bar.o")
+        path = _FOO_BAR_O
         fake_stub_info = remote_action.DownloadStubInfo(
             path=path,
             type="file",
@@ -287,19 +357,19 @@ class DownloadOutputStubInfosBatchTests(unittest.TestCase):
             action_digest="a7a77ed7f98/332",
             build_id="random-id987198129",
         )
-        with mock.patch.object(
+        self._patch_mock(
             remote_action, "_download_output_for_mp", new=_fake_download_output
-        ) as mock_download:  # success
-            statuses = remote_action.download_output_stub_infos_batch(
-                downloader=_FAKE_DOWNLOADER,
-                stub_infos=[fake_stub_info],
-                working_dir_abs=Path("."),
-            )
+        )
+        statuses = remote_action.download_output_stub_infos_batch(
+            downloader=_FAKE_DOWNLOADER,
+            stub_infos=[fake_stub_info],
+            working_dir_abs=_CURDIR,
+        )
 
         self.assertEqual(statuses[path].returncode, 0)
 
     def test_one_download_stub_downloaded_failure(self) -> None:
-        path = Path("foo/bar.o")
+        path = _FOO_BAR_O
         fake_stub_info = remote_action.DownloadStubInfo(
             path=path,
             type="file",
@@ -307,22 +377,22 @@ class DownloadOutputStubInfosBatchTests(unittest.TestCase):
             action_digest="a7a77ed7f98/332",
             build_id="random-id987198129",
         )
-        with mock.patch.object(
+        self._patch_mock(
             remote_action,
             "_download_output_for_mp",
             new=_fake_download_output_fail,
-        ) as mock_download:
-            statuses = remote_action.download_output_stub_infos_batch(
-                downloader=_FAKE_DOWNLOADER,
-                stub_infos=[fake_stub_info],
-                working_dir_abs=Path("."),
-            )
+        )
+        statuses = remote_action.download_output_stub_infos_batch(
+            downloader=_FAKE_DOWNLOADER,
+            stub_infos=[fake_stub_info],
+            working_dir_abs=_CURDIR,
+        )
 
         self.assertEqual(statuses[path].returncode, 1)
 
     def test_multiple_download_stub_downloaded_success(self) -> None:
-        path1 = Path("foo/bar.o")
-        path2 = Path("baz/quux.o")
+        path1 = _FOO_BAR_O
+        path2 = _BAZ_QUUX_O
         fake_stub_infos = [
             remote_action.DownloadStubInfo(
                 path=path1,
@@ -339,67 +409,67 @@ class DownloadOutputStubInfosBatchTests(unittest.TestCase):
                 build_id="random-id0012397",
             ),
         ]
-        with mock.patch.object(
+        self._patch_mock(
             remote_action, "_download_output_for_mp", new=_fake_download_output
-        ) as mock_download:  # success
-            statuses = remote_action.download_output_stub_infos_batch(
-                downloader=_FAKE_DOWNLOADER,
-                stub_infos=fake_stub_infos,
-                working_dir_abs=Path("."),
-            )
+        )
+        statuses = remote_action.download_output_stub_infos_batch(
+            downloader=_FAKE_DOWNLOADER,
+            stub_infos=fake_stub_infos,
+            working_dir_abs=_CURDIR,
+        )
 
         self.assertEqual(statuses[path1].returncode, 0)
         self.assertEqual(statuses[path2].returncode, 0)
 
 
-class DownloadInputStubPathsBatchTests(unittest.TestCase):
+class DownloadInputStubPathsBatchTests(_PatchingTestCase):
     def test_empty_list(self) -> None:
         statuses = remote_action.download_input_stub_paths_batch(
             downloader=_FAKE_DOWNLOADER,
             stub_paths=[],
-            working_dir_abs=Path("."),
+            working_dir_abs=_CURDIR,
         )
         self.assertEqual(statuses, {})
 
     def test_one_download_path_downloaded_success(self) -> None:
-        path = Path("foo/bar.o")
-        with mock.patch.object(
+        path = _FOO_BAR_O
+        self._patch_mock(
             remote_action, "_download_input_for_mp", new=_fake_download_input
-        ) as mock_download:  # success
-            statuses = remote_action.download_input_stub_paths_batch(
-                downloader=_FAKE_DOWNLOADER,
-                stub_paths=[path],
-                working_dir_abs=Path("."),
-            )
+        )
+        statuses = remote_action.download_input_stub_paths_batch(
+            downloader=_FAKE_DOWNLOADER,
+            stub_paths=[path],
+            working_dir_abs=_CURDIR,
+        )
 
         self.assertEqual(statuses[path].returncode, 0)
 
     def test_one_download_path_downloaded_failure(self) -> None:
-        path = Path("foo/bar.o")
-        with mock.patch.object(
+        path = _FOO_BAR_O
+        self._patch_mock(
             remote_action,
             "_download_input_for_mp",
             new=_fake_download_input_fail,
-        ) as mock_download:
-            statuses = remote_action.download_input_stub_paths_batch(
-                downloader=_FAKE_DOWNLOADER,
-                stub_paths=[path],
-                working_dir_abs=Path("."),
-            )
+        )
+        statuses = remote_action.download_input_stub_paths_batch(
+            downloader=_FAKE_DOWNLOADER,
+            stub_paths=[path],
+            working_dir_abs=_CURDIR,
+        )
 
         self.assertEqual(statuses[path].returncode, 1)
 
     def test_multiple_download_stub_downloaded_success(self) -> None:
-        path1 = Path("foo/bar.o")
-        path2 = Path("baz/quux.o")
-        with mock.patch.object(
+        path1 = _FOO_BAR_O
+        path2 = _BAZ_QUUX_O
+        self._patch_mock(
             remote_action, "_download_input_for_mp", new=_fake_download_input
-        ) as mock_download:  # success
-            statuses = remote_action.download_input_stub_paths_batch(
-                downloader=_FAKE_DOWNLOADER,
-                stub_paths=[path1, path2],
-                working_dir_abs=Path("."),
-            )
+        )
+        statuses = remote_action.download_input_stub_paths_batch(
+            downloader=_FAKE_DOWNLOADER,
+            stub_paths=[path1, path2],
+            working_dir_abs=_CURDIR,
+        )
 
         self.assertEqual(statuses[path1].returncode, 0)
         self.assertEqual(statuses[path2].returncode, 0)
@@ -416,8 +486,7 @@ class FakeReproxyLogEntry(remote_action.ReproxyLogEntry):
         self._completion_status: str
         # intentionally does not call super().__init__(), but instead
         # sets property attributes.
-        for k, v in kwargs.items():
-            setattr(self, "_" + k, v)
+        self.__dict__.update({"_" + k: v for k, v in kwargs.items()})
 
     @property
     def execution_id(self) -> str:
@@ -442,37 +511,53 @@ class FakeReproxyLogEntry(remote_action.ReproxyLogEntry):
 
 class FileMatchTests(unittest.TestCase):
     def test_match(self) -> None:
-        with tempfile.TemporaryDirectory() as td:
-            f1path = Path(td, "left.txt")
-            f2path = Path(td, "right.txt")
-            _write_file_contents(f1path, "a\n")
-            _write_file_contents(f2path, "a\n")
-            self.assertTrue(remote_action._files_match(f1path, f2path))
-            self.assertTrue(remote_action._files_match(f2path, f1path))
+        td = _scratch_dir(self.id())
+        f1path = td / "left.txt"
+        f2path = td / "right.txt"
+        _write_file_contents(f1path, "a\n")
+        shutil.copyfile(f1path, f2path)
+        self.assertTrue(remote_action._files_match(f1path, f2path))
+        self.assertTrue(remote_action._files_match(f2path, f1path))
 
     def test_not_match(self) -> None:
-        with tempfile.TemporaryDirectory() as td:
-            f1path = Path(td, "left.txt")
-            f2path = Path(td, "right.txt")
-            _write_file_contents(f1path, "a\n")
-            _write_file_contents(f2path, "b\n")
-            self.assertFalse(remote_action._files_match(f1path, f2path))
-            self.assertFalse(remote_action._files_match(f2path, f1path))
-
-
-class DetailDiffTests(unittest.TestCase):
+        td = _scratch_dir(self.id())
+        f1path = td / "left.txt"
+        f2path = td / "right.txt"
+        _write_file_contents(f1path, "a\n")
+        _write_file_contents(f2path, "b\n")
+        self.assertFalse(remote_action._files_match(f1path, f2path))
+        self.assertFalse(remote_action._files_match(f2path, f1path))
+
+
+class WriteExecutableFileTests(unittest.TestCase):
+    def test_new_file(self) -> None:
+        path = _scratch_dir(self.id()) / "run.sh"
+        remote_action._write_executable_file(path, "#!/bin/sh\n")
+        self.assertEqual(path.read_text(), "#!/bin/sh\n")
+        self.assertEqual(stat.S_IMODE(path.stat().st_mode), stat.S_IRWXU)
+
+    def test_overwrite_existing_file(self) -> None:
+        path = _scratch_dir(self.id()) / "run.sh"
+        _write_file_contents(path, "old contents that are longer\n")
+        path.chmod(0o644)
+        remote_action._write_executable_file(path, "new\n")
+        self.assertEqual(path.read_text(), "new\n")
+        self.assertEqual(stat.S_IMODE(path.stat().st_mode), stat.S_IRWXU)
+
+
+class DetailDiffTests(_PatchingTestCase):
     def test_called(self) -> None:
-        with mock.patch.object(
+        mock_call = self._patch_mock(
             cl_utils,
             "subprocess_call",
             return_value=cl_utils.SubprocessResult(0),
-        ) as mock_call:
-            self.assertEqual(
-                remote_action._detail_diff(
-                    Path("file1.txt"), Path("file2.txt")
-                ).returncode,
-                0,
-            )
+        )
+        self.assertEqual(
+            remote_action._detail_diff(
+                Path("file1.txt"), Path("file2.txt")
+            ).returncode,
+            0,
+        )
         mock_call.assert_called_once()
         first_call = mock_call.call_args_list[0]
         args, unused_kwargs = first_call
@@ -488,19 +573,19 @@ class DetailDiffTests(unittest.TestCase):
             # Pretend we wrote filtered views to filtered1 and filtered2.
             return True
 
-        with mock.patch.object(
+        mock_call = self._patch_mock(
             cl_utils,
             "subprocess_call",
             return_value=cl_utils.SubprocessResult(0),
-        ) as mock_call:
-            self.assertEqual(
-                remote_action._detail_diff_filtered(
-                    Path("file1.txt"),
-                    Path("file2.txt"),
-                    maybe_transform_pair=_filter_for_compare,
-                ).returncode,
-                0,
-            )
+        )
+        self.assertEqual(
+            remote_action._detail_diff_filtered(
+                Path("file1.txt"),
+                Path("file2.txt"),
+                maybe_transform_pair=_filter_for_compare,
+            ).returncode,
+            0,
+        )
         mock_call.assert_called_once()
         first_call = mock_call.call_args_list[0]
         args, unused_kwargs = first_call
@@ -512,16 +597,16 @@ class DetailDiffTests(unittest.TestCase):
         self.assertEqual(command[-1], "file2.txt.filtered")
 
 
-class TextDiffTests(unittest.TestCase):
+class TextDiffTests(_PatchingTestCase):
     def test_called(self) -> None:
         result = cl_utils.SubprocessResult(0)
-        with mock.patch.object(
+        mock_call = self._patch_mock(
             cl_utils, "subprocess_call", return_value=result
-        ) as mock_call:
-            self.assertEqual(
-                remote_action._text_diff(Path("file1.txt"), Path("file2.txt")),
-                result,
-            )
+        )
+        self.assertEqual(
+            remote_action._text_diff(Path("file1.txt"), Path("file2.txt")),
+            result,
+        )
         mock_call.assert_called_once()
         first_call = mock_call.call_args_list[0]
         args, unused_kwargs = first_call
@@ -530,136 +615,162 @@ class TextDiffTests(unittest.TestCase):
         self.assertEqual(command[-2:], ["file1.txt", "file2.txt"])
 
     def test_matches(self) -> None:  # no mocking
-        with tempfile.TemporaryDirectory() as td:
-            f1 = Path(td) / "left.txt"
-            f2 = Path(td) / "right.txt"
-            contents = "The quick brown fox\njumped over the lazy\ndogs.\n"
-            _write_file_contents(f1, contents)
-            _write_file_contents(f2, contents)
-            result = remote_action._text_diff(f1, f2)
-            self.assertEqual(result.returncode, 0)
-            self.assertEqual(result.stdout, [])
+        td = _scratch_dir(self.id())
+        f1 = td / "left.txt"
+        f2 = td / "right.txt"
+        _write_file_contents(f1, _QUICK_BROWN_FOX)
+        shutil.copyfile(f1, f2)
+        result = remote_action._text_diff(f1, f2)
+        self.assertEqual(result.returncode, 0)
+        self.assertEqual(result.stdout, [])
+
+    def test_matches_without_subprocess(self) -> None:
+        td = _scratch_dir(self.id())
+        f1 = td / "left.txt"
+        f2 = td / "right.txt"
+        _write_file_contents(f1, "same\n")
+        shutil.copyfile(f1, f2)
+        mock_call = self._patch_mock(cl_utils, "subprocess_call")
+        result = remote_action._text_diff(f1, f2)
+        self.assertEqual(result.returncode, 0)
+        mock_call.assert_not_called()
 
     def test_not_matches(self) -> None:  # no mocking
-        with tempfile.TemporaryDirectory() as td:
-            f1 = Path(td) / "left.txt"
-            f2 = Path(td) / "right.txt"
-            contents = "The quick brown fox\njumped over the lazy\ndogs.\n"
-            _write_file_contents(f1, contents)
-            _write_file_contents(f2, contents.replace("m", "M"))
-            result = remote_action._text_diff(f1, f2)
-            self.assertEqual(result.returncode, 1)
-            self.assertNotEqual(result.stdout, [])
+        td = _scratch_dir(self.id())
+        f1 = td / "left.txt"
+        f2 = td / "right.txt"
+        _write_file_contents(f1, _QUICK_BROWN_FOX)
+        _write_file_contents(f2, _QUICK_BROWN_FOX.replace(b"m", b"M"))
+        result = remote_action._text_diff(f1, f2)
+        self.assertEqual(result.returncode, 1)
+        self.assertNotEqual(result.stdout, [])
 
 
 class FilesUnderDirTests(unittest.TestCase):
     def test_walk(self) -> None:
-        with tempfile.TemporaryDirectory() as td:
-            f1path = Path(td) / "left.txt"
-            subdir = Path(td) / "sub"
-            os.mkdir(subdir)
-            f2path = subdir / "right.txt"
-            _write_file_contents(f1path, "\n")
-            _write_file_contents(f2path, "\n")
-            self.assertEqual(
-                set(remote_action._files_under_dir(Path(td))),
-                _paths({"left.txt", "sub/right.txt"}),
-            )
+        td = _scratch_dir(self.id())
+        f1path = td / "left.txt"
+        subdir = td / "sub"
+        os.mkdir(subdir)
+        f2path = subdir / "right.txt"
+        _write_file_contents(f1path, "\n")
+        shutil.copyfile(f1path, f2path)
+        self.assertEqual(
+            set(remote_action._files_under_dir(td)),
+            _paths({"left.txt", "sub/right.txt"}),
+        )
+
+    def test_symlinks(self) -> None:
+        td = _scratch_dir(self.id())
+        subdir = td / "sub"
+        os.mkdir(subdir)
+        _write_file_contents(subdir / "file.txt", "\n")
+        (td / "dir-link").symlink_to("sub")
+        (td / "file-link").symlink_to("sub/file.txt")
+        # Symlinks to directories are not followed, like os.walk().
+        self.assertEqual(
+            set(remote_action._files_under_dir(td)),
+            _paths({"file-link", "sub/file.txt"}),
+        )
+
+    def test_missing_dir(self) -> None:
+        td = _scratch_dir(self.id())
+        self.assertEqual(
+            list(remote_action._files_under_dir(td / "does-not-exist")), []
+        )
+
 
+class CommonFilesUnderDirsTests(_PatchingTestCase):
+    # Paths are immutable, so they can be shared across tests.
+    _LEFT_DIR, _RIGHT_DIR = _paths(("foo-dir", "bar-dir"))
+    _A, _B_X, _C, _D = _paths(("a", "b/x", "c", "d"))
 
-class CommonFilesUnderDirsTests(unittest.TestCase):
     def test_none_in_common(self) -> None:
-        with mock.patch.object(
+        self._patch_mock(
             remote_action,
             "_files_under_dir",
             side_effect=[iter(["a", "b", "c"]), iter(["d", "e", "f"])],
-        ) as mock_lsr:
-            self.assertEqual(
-                remote_action._common_files_under_dirs(
-                    Path("foo-dir"), Path("bar-dir")
-                ),
-                set(),
-            )
+        )
+        self.assertEqual(
+            remote_action._common_files_under_dirs(
+                self._LEFT_DIR, self._RIGHT_DIR
+            ),
+            set(),
+        )
 
     def test_some_in_common(self) -> None:
-        with mock.patch.object(
+        self._patch_mock(
             remote_action,
             "_files_under_dir",
             side_effect=[
-                iter(_paths(["a", "b/x", "c"])),
-                iter(_paths(["d", "c", "b/x"])),
+                iter((self._A, self._B_X, self._C)),
+                iter((self._D, self._C, self._B_X)),
             ],
-        ) as mock_lsr:
-            self.assertEqual(
-                set(
-                    remote_action._common_files_under_dirs(
-                        Path("foo-dir"), Path("bar-dir")
-                    )
-                ),
-                _paths({"b/x", "c"}),
-            )
+        )
+        self.assertEqual(
+            set(
+                remote_action._common_files_under_dirs(
+                    self._LEFT_DIR, self._RIGHT_DIR
+                )
+            ),
+            {self._B_X, self._C},
+        )
 
 
-class ExpandCommonFilesBetweenDirs(unittest.TestCase):
+class ExpandCommonFilesBetweenDirs(_PatchingTestCase):
     def test_common(self) -> None:
         # Normally returns a set, but mock-return a list for deterministic
         # ordering.
-        with mock.patch.object(
+        self._patch_mock(
             remote_action,
             "_common_files_under_dirs",
             return_value=_paths(["y/z", "x"]),
-        ) as mock_ls:
-            self.assertEqual(
-                list(
-                    remote_action._expand_common_files_between_dirs(
-                        [(Path("c"), Path("d")), (Path("a"), Path("b"))]
-                    )
-                ),
-                [
-                    _paths(("c/x", "d/x")),
-                    _paths(("c/y/z", "d/y/z")),
-                    _paths(("a/x", "b/x")),
-                    _paths(("a/y/z", "b/y/z")),
-                ],
-            )
+        )
+        self.assertEqual(
+            list(
+                remote_action._expand_common_files_between_dirs(
+                    [(Path("c"), Path("d")), (Path("a"), Path("b"))]
+                )
+            ),
+            [
+                _paths(("c/x", "d/x")),
+                _paths(("c/y/z", "d/y/z")),
+                _paths(("a/x", "b/x")),
+                _paths(("a/y/z", "b/y/z")),
+            ],
+        )
 
 
 class FileLinesMatchingTests(unittest.TestCase):
     def test_empty(self) -> None:
-        with mock.patch(
-            "builtins.open", mock.mock_open(read_data="")
-        ) as mock_file:
-            self.assertEqual(
-                list(
-                    remote_action._file_lines_matching(
-                        Path("log.txt"), "never-match"
-                    )
-                ),
-                [],
-            )
+        log = _scratch_dir(self.id()) / "log.txt"
+        _write_file_contents(log, "")
+        self.assertEqual(
+            list(remote_action._file_lines_matching(log, "never-match")),
+            [],
+        )
 
     def test_matches(self) -> None:
-        with mock.patch(
-            "builtins.open", mock.mock_open(read_data="ab\nbc\ncd\n")
-        ) as mock_file:
-            self.assertEqual(
-                list(remote_action._file_lines_matching(Path("file.txt"), "c")),
-                ["bc\n", "cd\n"],
-            )
+        f = _scratch_dir(self.id()) / "file.txt"
+        _write_file_contents(f, "ab\nbc\ncd\n")
+        self.assertEqual(
+            list(remote_action._file_lines_matching(f, "c")),
+            ["bc\n", "cd\n"],
+        )
 
 
 class TransformFileByLines(unittest.TestCase):
     def test_no_change(self) -> None:
-        with tempfile.TemporaryDirectory() as td:
-            f1 = Path(td) / "in.txt"
-            f2 = Path(td) / "out.txt"
-            _write_file_contents(
-                f1, "aa\n\n\nbb\ncc dd\n\ne f \n gh ij\n  k  l  \n"
-            )
-            remote_action._transform_file_by_lines(f1, f2, lambda x: x)
-            s1 = _read_file_contents(f1)
-            s2 = _read_file_contents(f2)
-            self.assertEqual(s1, s2)
+        td = _scratch_dir(self.id())
+        f1 = td / "in.txt"
+        f2 = td / "out.txt"
+        _write_file_contents(
+            f1, "aa\n\n\nbb\ncc dd\n\ne f \n gh ij\n  k  l  \n"
+        )
+        remote_action._transform_file_by_lines(f1, f2, lambda x: x)
+        s1 = _read_file_contents(f1)
+        s2 = _read_file_contents(f2)
+        self.assertEqual(s1, s2)
 
 
 class ReclientCanonicalWorkingDirTests(unittest.TestCase):
@@ -691,45 +802,45 @@ class ReclientCanonicalWorkingDirTests(unittest.TestCase):
 
 class RewriteDepfileTests(unittest.TestCase):
     def test_depfile_in_place(self) -> None:
-        with tempfile.TemporaryDirectory() as td:
-            depfile = Path(td) / "dep.d"
+        td = _scratch_dir(self.id())
+        depfile = td / "dep.d"
 
-            wd = Path("/home/base/out/inside/here")
-            _write_file_contents(
-                depfile, f"obj/foo.o: {wd}/foo/bar.h {wd}/baz/quux.h\n"
-            )
-            remote_action.rewrite_depfile(
-                depfile,
-                transform=lambda x: remote_action._remove_prefix(x, f"{wd}/"),
-            )  # write in-place
-            self.assertEqual(
-                _read_file_contents(depfile),
-                "obj/foo.o: foo/bar.h baz/quux.h\n",
-            )
+        wd = Path("/home/base/out/inside/here")
+        _write_file_contents(
+            depfile, f"obj/foo.o: {wd}/foo/bar.h {wd}/baz/quux.h\n"
+        )
+        remote_action.rewrite_depfile(
+            depfile,
+            transform=lambda x: remote_action._remove_prefix(x, f"{wd}/"),
+        )  # write in-place
+        self.assertEqual(
+            _read_file_contents(depfile),
+            "obj/foo.o: foo/bar.h baz/quux.h\n",
+        )
 
     def test_depfile_new_file(self) -> None:
-        with tempfile.TemporaryDirectory() as td:
-            depfile = Path(td) / "dep.d"
-            output = depfile.with_suffix(".new")
-
-            wd = Path("/all/your/base")
-            _write_file_contents(
-                depfile, f"obj/foo.o: {wd}/foo/bar.h {wd}/baz/quux.h\n"
-            )
-            remote_action.rewrite_depfile(
-                depfile,
-                transform=lambda x: remote_action._remove_prefix(x, f"{wd}/"),
-                output=output,
-            )  # write new file
-            self.assertEqual(
-                _read_file_contents(output),
-                "obj/foo.o: foo/bar.h baz/quux.h\n",
-            )
+        td = _scratch_dir(self.id())
+        depfile = td / "dep.d"
+        output = depfile.with_suffix(".new")
+
+        wd = Path("/all/your/base")
+        _write_file_contents(
+            depfile, f"obj/foo.o: {wd}/foo/bar.h {wd}/baz/quux.h\n"
+        )
+        remote_action.rewrite_depfile(
+            depfile,
+            transform=lambda x: remote_action._remove_prefix(x, f"{wd}/"),
+            output=output,
+        )  # write new file
+        self.assertEqual(
+            _read_file_contents(output),
+            "obj/foo.o: foo/bar.h baz/quux.h\n",
+        )
 
 
-class ResolvedShlibsFromLddTests(unittest.TestCase):
-    def test_sample(self) -> None:
-        ldd_output = """
+# Sample 'ldd' output, and the shared libraries it resolves to.
+_LDD_SAMPLE_LINES = tuple(
+    """
 	linux-vdso.so.1 (0x00007ffd653b2000)
 	librustc_driver-897e90da9cc472c4.so => /usr/home/janedoe/my_project/tools/rust/linux-x64/bin/../lib/librustc_driver-897e90da9cc472c4.so (0x00007f6fdf600000)
 	libstd-374958b5d3497a8f.so => /usr/home/janedoe/my_project/tools/rust/linux-x64/bin/../lib/libstd-374958b5d3497a8f.so (0x00007f6fdf45c000)
@@ -740,58 +851,56 @@ class ResolvedShlibsFromLddTests(unittest.TestCase):
 	libLLVM-15-rust-1.70.0-nightly.so => /usr/home/janedoe/my_project/tools/rust/linux-x64/bin/../lib/../lib/libLLVM-15-rust-1.70.0-nightly.so (0x00007f6fdb000000)
 	libm.so.6 => /lib/x86_64-linux-gnu/libm.so.6 (0x00007f6fe2921000)
 	/lib64/ld-linux-x86-64.so.2 (0x00007f6fe2ce6000)
-"""
+""".splitlines()
+)
+
+_LDD_SAMPLE_SHLIBS = _paths(
+    (
+        "/usr/home/janedoe/my_project/tools/rust/linux-x64/bin/../lib/librustc_driver-897e90da9cc472c4.so",
+        "/usr/home/janedoe/my_project/tools/rust/linux-x64/bin/../lib/libstd-374958b5d3497a8f.so",
+        "/lib/x86_64-linux-gnu/libdl.so.2",
+        "/lib/x86_64-linux-gnu/librt.so.1",
+        "/lib/x86_64-linux-gnu/libpthread.so.0",
+        "/lib/x86_64-linux-gnu/libc.so.6",
+        "/usr/home/janedoe/my_project/tools/rust/linux-x64/bin/../lib/../lib/libLLVM-15-rust-1.70.0-nightly.so",
+        "/lib/x86_64-linux-gnu/libm.so.6",
+    )
+)
+
+# The subset of _LDD_SAMPLE_SHLIBS that are not system libraries.
+_LDD_SAMPLE_NONSYSTEM_SHLIBS = _paths(
+    (
+        "/usr/home/janedoe/my_project/tools/rust/linux-x64/bin/../lib/librustc_driver-897e90da9cc472c4.so",
+        "/usr/home/janedoe/my_project/tools/rust/linux-x64/bin/../lib/libstd-374958b5d3497a8f.so",
+        "/usr/home/janedoe/my_project/tools/rust/linux-x64/bin/../lib/../lib/libLLVM-15-rust-1.70.0-nightly.so",
+    )
+)
+
+
+class ResolvedShlibsFromLddTests(unittest.TestCase):
+    def test_sample(self) -> None:
         self.assertEqual(
-            list(
-                remote_action.resolved_shlibs_from_ldd(ldd_output.splitlines())
-            ),
-            _paths(
-                [
-                    "/usr/home/janedoe/my_project/tools/rust/linux-x64/bin/../lib/librustc_driver-897e90da9cc472c4.so",
-                    "/usr/home/janedoe/my_project/tools/rust/linux-x64/bin/../lib/libstd-374958b5d3497a8f.so",
-                    "/lib/x86_64-linux-gnu/libdl.so.2",
-                    "/lib/x86_64-linux-gnu/librt.so.1",
-                    "/lib/x86_64-linux-gnu/libpthread.so.0",
-                    "/lib/x86_64-linux-gnu/libc.so.6",
-                    "/usr/home/janedoe/my_project/tools/rust/linux-x64/bin/../lib/../lib/libLLVM-15-rust-1.70.0-nightly.so",
-                    "/lib/x86_64-linux-gnu/libm.so.6",
-                ]
-            ),
+            list(remote_action.resolved_shlibs_from_ldd(_LDD_SAMPLE_LINES)),
+            list(_LDD_SAMPLE_SHLIBS),
         )
 
 
-class HostToolNonsystemShlibsTests(unittest.TestCase):
+class HostToolNonsystemShlibsTests(_PatchingTestCase):
     def test_sample(self) -> None:
-        unfiltered_shlibs = _paths(
-            [
-                "/usr/home/janedoe/my_project/tools/rust/linux-x64/bin/../lib/librustc_driver-897e90da9cc472c4.so",
-                "/usr/home/janedoe/my_project/tools/rust/linux-x64/bin/../lib/libstd-374958b5d3497a8f.so",
-                "/lib/x86_64-linux-gnu/libdl.so.2",
-                "/lib/x86_64-linux-gnu/librt.so.1",
-                "/lib/x86_64-linux-gnu/libpthread.so.0",
-                "/lib/x86_64-linux-gnu/libc.so.6",
-                "/usr/home/janedoe/my_project/tools/rust/linux-x64/bin/../lib/../lib/libLLVM-15-rust-1.70.0-nightly.so",
-                "/lib/x86_64-linux-gnu/libm.so.6",
-                "/usr/lib/something_else.so",
-            ]
-        )
-        with mock.patch.object(
+        unfiltered_shlibs = list(_LDD_SAMPLE_SHLIBS) + [
+            Path("/usr/lib/something_else.so")
+        ]
+        mock_host_tool_shlibs = self._patch_mock(
             remote_action, "host_tool_shlibs", return_value=unfiltered_shlibs
-        ) as mock_host_tool_shlibs:
-            self.assertEqual(
-                list(
-                    remote_action.host_tool_nonsystem_shlibs(
-                        Path("../path/to/rustc")
-                    )
-                ),
-                _paths(
-                    [
-                        "/usr/home/janedoe/my_project/tools/rust/linux-x64/bin/../lib/librustc_driver-897e90da9cc472c4.so",
-                        "/usr/home/janedoe/my_project/tools/rust/linux-x64/bin/../lib/libstd-374958b5d3497a8f.so",
-                        "/usr/home/janedoe/my_project/tools/rust/linux-x64/bin/../lib/../lib/libLLVM-15-rust-1.70.0-nightly.so",
-                    ]
-                ),
-            )
+        )
+        self.assertEqual(
+            list(
+                remote_action.host_tool_nonsystem_shlibs(
+                    Path("../path/to/rustc")
+                )
+            ),
+            list(_LDD_SAMPLE_NONSYSTEM_SHLIBS),
+        )
         mock_host_tool_shlibs.assert_called_once()
 
 
@@ -828,26 +937,78 @@ class RewrapperArgParserTests(unittest.TestCase):
             mock_exit.assert_not_called()
 
 
-class RemoteActionMainParserTests(unittest.TestCase):
-    @property
-    def default_cfg(self) -> Path:
-        return Path("default.cfg")
+# Paths used by tests that construct RemoteActions.
+_EXEC_ROOT = Path("/home/project")
+_BUILD_DIR = Path("build-out")
+_WORKING_DIR = _EXEC_ROOT / _BUILD_DIR
+_EXEC_ROOT_REL = cl_utils.relpath(_EXEC_ROOT, start=_WORKING_DIR)
+_HELLO_TXT = Path("hello.txt")
+_HELLO_TXT_REMOTE = Path("hello.txt.remote")
+_HELLO_TXT_REMOTE_TRACE = Path("hello.txt.remote-fsatrace")
+_HELLO_TXT_LOCAL_TRACE = Path("hello.txt.local-fsatrace")
+
+_SUCCESS_RESULT = cl_utils.SubprocessResult(0)
+
+
+def _patch_run_maybe_remotely(
+    result: cl_utils.SubprocessResult = _SUCCESS_RESULT,
+) -> Any:
+    """Patches RemoteAction._run_maybe_remotely() to return result."""
+    return mock.patch.object(
+        remote_action.RemoteAction, "_run_maybe_remotely", return_value=result
+    )
+
+
+# Contents of a reproxy/rewrapper cfg file, for tests that mock reading it.
+_FAKE_CFG_TEXT = "\n".join(
+    [
+        "parameter_this=1",
+        "parameter_that=do_not_care",
+        "platform=foo=bar,baz=quux",
+    ]
+)
 
-    @property
-    def default_bindir(self) -> Path:
-        return Path("/opt/reclient/bin")
 
-    def _make_main_parser(self) -> argparse.ArgumentParser:
-        parser = argparse.ArgumentParser()
+class RemoteActionMainParserTests(_PatchingTestCase):
+    default_cfg = Path("default.cfg")
+    default_bindir = Path("/opt/reclient/bin")
+
+    @classmethod
+    def setUpClass(cls) -> None:
+        # Parsing does not modify the parser, so all tests can share one.
+        cls._main_parser = argparse.ArgumentParser()
         remote_action.inherit_main_arg_parser_flags(
-            parser,
-            default_cfg=self.default_cfg,
-            default_bindir=self.default_bindir,
+            cls._main_parser,
+            default_cfg=cls.default_cfg,
+            default_bindir=cls.default_bindir,
+        )
+        # Sink for output that tests do not inspect.
+        cls._devnull = open(os.devnull, "w")
+        cls.addClassCleanup(cls._devnull.close)
+
+    def _make_compare_action(
+        self, *flags: str, **kwargs: Any
+    ) -> Tuple[argparse.Namespace, remote_action.RemoteAction]:
+        """Parses --compare (and flags) for a command that touches _HELLO_TXT.
+
+        Returns the parsed main args and the action built from them, with
+        _HELLO_TXT as its output, and any other RemoteAction params from
+        kwargs.
+        """
+        main_args, _ = self._main_parser.parse_known_args(
+            ["--compare", *flags, "--", "touch", str(_HELLO_TXT)]
+        )
+        action = remote_action.remote_action_from_args(
+            main_args,
+            output_files=[_HELLO_TXT],
+            exec_root=_EXEC_ROOT,
+            working_dir=_WORKING_DIR,
+            **kwargs,
         )
-        return parser
+        return main_args, action
 
     def test_defaults(self) -> None:
-        p = self._make_main_parser()
+        p = self._main_parser
         main_args, other = p.parse_known_args(["--", "echo", "hello"])
         self.assertEqual(main_args.cfg, self.default_cfg)
         self.assertEqual(main_args.bindir, self.default_bindir)
@@ -863,7 +1024,7 @@ class RemoteActionMainParserTests(unittest.TestCase):
         self.assertIsNone(main_args.remote_debug_command)
 
     def test_cfg(self) -> None:
-        p = self._make_main_parser()
+        p = self._main_parser
         cfg = Path("other.cfg")
         main_args, other = p.parse_known_args([f"--cfg={cfg}", "--", "echo"])
         self.assertEqual(main_args.cfg, cfg)
@@ -874,7 +1035,7 @@ class RemoteActionMainParserTests(unittest.TestCase):
         self.assertEqual(action.options, ["--cfg", str(cfg)])
 
     def test_platform_merge_override_no_env(self) -> None:
-        p = self._make_main_parser()
+        p = self._main_parser
         cfg = Path("other.cfg")
         platform_value = "foo=zoo,alice=bob"
         # Test both styles of flags.
@@ -882,47 +1043,48 @@ class RemoteActionMainParserTests(unittest.TestCase):
             [f"--platform={platform_value}"],
             ["--platform", platform_value],
         )
-        for flags in test_flag_variants:
-            main_args, remote_options = p.parse_known_args(
-                [f"--cfg={cfg}"] + flags + ["--", "echo"]
-            )
-            self.assertEqual(main_args.cfg, cfg)
-            self.assertEqual(main_args.platform, platform_value)
-            action = remote_action.remote_action_from_args(
-                main_args=main_args,
-                remote_options=remote_options,
-            )
-            self.assertEqual(action.config, cfg)
-            self.assertEqual(action.platform, platform_value)
-            self.assertEqual(action.local_only_command, ["echo"])
-            with mock.patch.object(
-                Path,
-                "read_text",
-                return_value="\n".join(
-                    [
-                        "parameter_this=1",
-                        "parameter_that=do_not_care",
-                        "platform=foo=bar,baz=quux",
-                    ]
-                ),
-            ) as mock_read_cfg:
-                with mock.patch.object(
-                    remote_action, "_rewrapper_platform_env", return_value=None
-                ) as mock_env:
-                    self.assertEqual(
-                        action.options,
-                        [
-                            "--cfg",
-                            str(cfg),
-                            "--platform=alice=bob,baz=quux,foo=zoo",
-                        ],
-                    )
-
-            mock_read_cfg.assert_called_once_with()
-            mock_env.assert_called_once_with()
+        mock_read_cfg = self._patch_mock(
+            Path, "read_text", return_value=_FAKE_CFG_TEXT
+        )
+        mock_env = self._patch_mock(
+            remote_action, "_rewrapper_platform_env", return_value=None
+        )
+        parsed = [
+            p.parse_known_args([f"--cfg={cfg}"] + flags + ["--", "echo"])
+            for flags in test_flag_variants
+        ]
+        for flags, (main_args, remote_options) in zip(
+            test_flag_variants, parsed
+        ):
+            with self.subTest(flags=flags):
+                self.assertEqual(main_args.cfg, cfg)
+                self.assertEqual(main_args.platform, platform_value)
+
+        # Both styles parse the same, so one action covers them.
+        for flags, result in zip(test_flag_variants[1:], parsed[1:]):
+            with self.subTest(flags=flags):
+                self.assertEqual(result, parsed[0])
+        main_args, remote_options = parsed[0]
+        action = remote_action.remote_action_from_args(
+            main_args=main_args,
+            remote_options=remote_options,
+        )
+        self.assertEqual(action.config, cfg)
+        self.assertEqual(action.platform, platform_value)
+        self.assertEqual(action.local_only_command, ["echo"])
+        self.assertEqual(
+            action.options,
+            [
+                "--cfg",
+                str(cfg),
+                "--platform=alice=bob,baz=quux,foo=zoo",
+            ],
+        )
+        mock_read_cfg.assert_called_once_with()
+        mock_env.assert_called_once_with()
 
     def test_platform_merge_env_no_flag(self) -> None:
-        p = self._make_main_parser()
+        p = self._main_parser
         cfg = Path("other.cfg")
         platform_env = "foo=notfoo,alice=joe"
         # Test both styles of flags.
@@ -936,44 +1098,33 @@ class RemoteActionMainParserTests(unittest.TestCase):
         )
         self.assertEqual(action.config, cfg)
         self.assertEqual(action.local_only_command, ["echo"])
-        with mock.patch.object(
-            Path,
-            "read_text",
-            return_value="\n".join(
-                [
-                    "parameter_this=1",
-                    "parameter_that=do_not_care",
-                    "platform=foo=bar,baz=quux",
-                ]
-            ),
-        ) as mock_read_cfg:
-            with mock.patch.object(
-                remote_action,
-                "_rewrapper_platform_env",
-                return_value=platform_env,
-            ) as mock_env:
-                self.assertEqual(
-                    action.options,
-                    [
-                        "--cfg",
-                        str(cfg),
-                        # no need to rewrite --platform flag
-                    ],
-                )
-                self.assertEqual(
-                    action.merged_platform,
-                    # did not use cfg's platform values
-                    {
-                        "alice": "joe",
-                        "foo": "notfoo",
-                    },
-                )
-
+        mock_read_cfg = self._patch_mock(
+            Path, "read_text", return_value=_FAKE_CFG_TEXT
+        )
+        mock_env = self._patch_mock(
+            remote_action, "_rewrapper_platform_env", return_value=platform_env
+        )
+        self.assertEqual(
+            action.options,
+            [
+                "--cfg",
+                str(cfg),
+                # no need to rewrite --platform flag
+            ],
+        )
+        self.assertEqual(
+            action.merged_platform,
+            # did not use cfg's platform values
+            {
+                "alice": "joe",
+                "foo": "notfoo",
+            },
+        )
         mock_read_cfg.assert_not_called()  # used env, not cfg
         mock_env.assert_called_once_with()
 
     def test_platform_merge_override_with_env(self) -> None:
-        p = self._make_main_parser()
+        p = self._main_parser
         cfg = Path("other.cfg")
         platform_value = "foo=zoo,alice=bob"
         # Test both styles of flags.
@@ -981,49 +1132,50 @@ class RemoteActionMainParserTests(unittest.TestCase):
             [f"--platform={platform_value}"],
             ["--platform", platform_value],
         )
-        for flags in test_flag_variants:
-            main_args, remote_options = p.parse_known_args(
-                [f"--cfg={cfg}"] + flags + ["--", "echo"]
-            )
-            self.assertEqual(main_args.cfg, cfg)
-            self.assertEqual(main_args.platform, platform_value)
-            action = remote_action.remote_action_from_args(
-                main_args=main_args,
-                remote_options=remote_options,
-            )
-            self.assertEqual(action.config, cfg)
-            self.assertEqual(action.platform, platform_value)
-            self.assertEqual(action.local_only_command, ["echo"])
-            with mock.patch.object(
-                Path,
-                "read_text",
-                return_value="\n".join(
-                    [
-                        "parameter_this=1",
-                        "parameter_that=do_not_care",
-                        "platform=foo=bar,baz=quux",
-                    ]
-                ),
-            ) as mock_read_cfg:
-                with mock.patch.object(
-                    remote_action,
-                    "_rewrapper_platform_env",
-                    return_value="foo=env_foo,baz=env_baz",
-                ) as mock_env:
-                    self.assertEqual(
-                        action.options,
-                        [
-                            "--cfg",
-                            str(cfg),
-                            "--platform=alice=bob,baz=env_baz,foo=zoo",
-                        ],
-                    )
-
-            mock_read_cfg.assert_not_called()  # because env was used
-            mock_env.assert_called_once_with()
+        mock_read_cfg = self._patch_mock(
+            Path, "read_text", return_value=_FAKE_CFG_TEXT
+        )
+        mock_env = self._patch_mock(
+            remote_action,
+            "_rewrapper_platform_env",
+            return_value="foo=env_foo,baz=env_baz",
+        )
+        parsed = [
+            p.parse_known_args([f"--cfg={cfg}"] + flags + ["--", "echo"])
+            for flags in test_flag_variants
+        ]
+        for flags, (main_args, remote_options) in zip(
+            test_flag_variants, parsed
+        ):
+            with self.subTest(flags=flags):
+                self.assertEqual(main_args.cfg, cfg)
+                self.assertEqual(main_args.platform, platform_value)
+
+        # Both styles parse the same, so one action covers them.
+        for flags, result in zip(test_flag_variants[1:], parsed[1:]):
+            with self.subTest(flags=flags):
+                self.assertEqual(result, parsed[0])
+        main_args, remote_options = parsed[0]
+        action = remote_action.remote_action_from_args(
+            main_args=main_args,
+            remote_options=remote_options,
+        )
+        self.assertEqual(action.config, cfg)
+        self.assertEqual(action.platform, platform_value)
+        self.assertEqual(action.local_only_command, ["echo"])
+        self.assertEqual(
+            action.options,
+            [
+                "--cfg",
+                str(cfg),
+                "--platform=alice=bob,baz=env_baz,foo=zoo",
+            ],
+        )
+        mock_read_cfg.assert_not_called()  # because env was used
+        mock_env.assert_called_once_with()
 
     def test_bindir(self) -> None:
-        p = self._make_main_parser()
+        p = self._main_parser
         bindir = Path("/usr/local/bin")
         main_args, other = p.parse_known_args(
             ["--bindir", str(bindir), "--", "echo"]
@@ -1034,7 +1186,7 @@ class RemoteActionMainParserTests(unittest.TestCase):
 
     def test_local_command_with_env(self) -> None:
         local_command = ["FOO=BAR", "echo"]
-        p = self._make_main_parser()
+        p = self._main_parser
         main_args, other = p.parse_known_args(["--"] + local_command)
         action = remote_action.remote_action_from_args(main_args)
         self.assertEqual(
@@ -1045,12 +1197,12 @@ class RemoteActionMainParserTests(unittest.TestCase):
         )
 
     def test_verbose(self) -> None:
-        p = self._make_main_parser()
+        p = self._main_parser
         main_args, other = p.parse_known_args(["--verbose", "--", "echo"])
         self.assertTrue(main_args.verbose)
 
     def test_dry_run(self) -> None:
-        p = self._make_main_parser()
+        p = self._main_parser
         main_args, other = p.parse_known_args(["--dry-run", "--", "echo"])
         self.assertTrue(main_args.dry_run)
         action = remote_action.remote_action_from_args(main_args)
@@ -1062,7 +1214,7 @@ class RemoteActionMainParserTests(unittest.TestCase):
     @mock.patch.object(fuchsia, "REPROXY_WRAP", "/path/to/reproxy-wrap.sh")
     def test_auto_reproxy(self) -> None:
         # --auto-reproxy is now obsolete, and will be removed in the future
-        p = self._make_main_parser()
+        p = self._main_parser
         main_args, other = p.parse_known_args(["--auto-reproxy", "--", "echo"])
         self.assertTrue(main_args.auto_reproxy)
         action = remote_action.remote_action_from_args(main_args)
@@ -1074,7 +1226,7 @@ class RemoteActionMainParserTests(unittest.TestCase):
         self.assertEqual(remote_command, ["echo"])
 
     def test_save_temps(self) -> None:
-        p = self._make_main_parser()
+        p = self._main_parser
         main_args, other = p.parse_known_args(["--save-temps", "--", "echo"])
         self.assertTrue(main_args.save_temps)
         action = remote_action.remote_action_from_args(main_args)
@@ -1082,14 +1234,14 @@ class RemoteActionMainParserTests(unittest.TestCase):
         self.assertTrue(action.save_temps)
 
     def test_label(self) -> None:
-        p = self._make_main_parser()
+        p = self._main_parser
         main_args, other = p.parse_known_args(
             ["--label=//build/this:that", "--", "echo"]
         )
         self.assertEqual(main_args.label, "//build/this:that")
 
     def test_diagnose_nonzero(self) -> None:
-        p = self._make_main_parser()
+        p = self._main_parser
         main_args, other = p.parse_known_args(
             ["--diagnose-nonzero", "--", "echo"]
         )
@@ -1098,63 +1250,57 @@ class RemoteActionMainParserTests(unittest.TestCase):
         self.assertTrue(action.diagnose_nonzero)
 
     def test_input_list_paths(self) -> None:
-        exec_root = Path("/home/project")
-        build_dir = Path("build-out")
-        working_dir = exec_root / build_dir
         input1 = Path("hello.txt")
         input2 = Path("goodbye.txt")
-        with tempfile.TemporaryDirectory() as td:
-            rspfile1 = Path(td) / "inputs.rsp"
-            _write_file_contents(rspfile1, f"{input1}\n")
-            rspfile2 = Path(td) / "more-inputs.rsp"
-            _write_file_contents(rspfile2, f"{input2}\n")
-
-            p = self._make_main_parser()
-            main_args, other = p.parse_known_args(
-                _strs(
-                    [
-                        f"--input_list_paths={rspfile1},{rspfile2}",
-                        "--",
-                        "cat",
-                        input1,
-                        input2,
-                    ]
-                )
-            )
-            action = remote_action.remote_action_from_args(
-                main_args,
-                exec_root=exec_root,
-                working_dir=working_dir,
-            )
+        td = _scratch_dir(self.id())
+        rspfile1 = td / "inputs.rsp"
+        _write_file_contents(rspfile1, f"{input1}\n")
+        rspfile2 = td / "more-inputs.rsp"
+        _write_file_contents(rspfile2, f"{input2}\n")
 
-            self.assertEqual(
-                set(action.inputs_relative_to_project_root),
-                {
-                    build_dir / input1,
-                    build_dir / input2,
-                },  # relative to exec_root
+        p = self._main_parser
+        main_args, other = p.parse_known_args(
+            _strs(
+                [
+                    f"--input_list_paths={rspfile1},{rspfile2}",
+                    "--",
+                    "cat",
+                    input1,
+                    input2,
+                ]
             )
+        )
+        action = remote_action.remote_action_from_args(
+            main_args,
+            exec_root=_EXEC_ROOT,
+            working_dir=_WORKING_DIR,
+        )
+
+        self.assertCountEqual(
+            action.inputs_relative_to_project_root,
+            [
+                _BUILD_DIR / input1,
+                _BUILD_DIR / input2,
+            ],  # relative to exec_root
+        )
 
     def test_remote_debug_command(self) -> None:
-        exec_root = Path("/home/project")
-        build_dir = Path("build-out")
-        working_dir = exec_root / build_dir
         input = Path("hello.txt")
         debug = "ls -l -R .."
-        p = self._make_main_parser()
+        p = self._main_parser
         main_args, other = p.parse_known_args(
             _strs([f"--remote-debug-command={debug}", "--", "cat", input])
         )
         action = remote_action.remote_action_from_args(
             main_args,
             inputs=[input],
-            exec_root=exec_root,
-            working_dir=working_dir,
+            exec_root=_EXEC_ROOT,
+            working_dir=_WORKING_DIR,
         )
 
         self.assertEqual(action.remote_debug_command, debug.split())
-        self.assertEqual(
-            {build_dir / input}, set(action.inputs_relative_to_project_root)
+        self.assertCountEqual(
+            [_BUILD_DIR / input], action.inputs_relative_to_project_root
         )
         with mock.patch.object(cl_utils, "subprocess_call") as mock_remote:
             self.assertEqual(action.run(), 1)
@@ -1167,39 +1313,36 @@ class RemoteActionMainParserTests(unittest.TestCase):
         self.assertEqual(remote_command, debug.split())
 
     def test_remote_log_named(self) -> None:
-        p = self._make_main_parser()
+        p = self._main_parser
         main_args, other = p.parse_known_args(
             ["--log", "bar.remote-log", "--", "echo"]
         )
         self.assertEqual(main_args.remote_log, "bar.remote-log")
 
     def test_remote_log_unnamed(self) -> None:
-        p = self._make_main_parser()
+        p = self._main_parser
         main_args, other = p.parse_known_args(["--log", "--", "echo"])
         self.assertEqual(main_args.remote_log, "<AUTO>")
 
     def test_remote_log_from_main_args_auto_named(self) -> None:
-        exec_root = Path("/home/project")
-        build_dir = Path("build-out")
-        working_dir = exec_root / build_dir
-        output = Path("hello.txt")
+        output = _HELLO_TXT
         command = ["touch", str(output)]
-        p = self._make_main_parser()
+        p = self._main_parser
         main_args, other = p.parse_known_args(["--log", "--"] + command)
         action = remote_action.remote_action_from_args(
             main_args,
             output_files=[output],
-            exec_root=exec_root,
-            working_dir=working_dir,
+            exec_root=_EXEC_ROOT,
+            working_dir=_WORKING_DIR,
         )
 
         self.assertEqual(
             [remote_action._REMOTE_LOG_SCRIPT],
             action.inputs_relative_to_project_root,
         )
-        self.assertEqual(
-            {build_dir / output, build_dir / (str(output) + ".remote-log")},
-            set(action.output_files_relative_to_project_root),
+        self.assertCountEqual(
+            [_BUILD_DIR / output, _BUILD_DIR / (str(output) + ".remote-log")],
+            action.output_files_relative_to_project_root,
         )
         # Ignore the rewrapper portion of the command
         full_command = action.launch_command
@@ -1221,12 +1364,9 @@ class RemoteActionMainParserTests(unittest.TestCase):
         self.assertEqual(main_command, command)
 
     def test_remote_log_from_main_args_explicitly_named(self) -> None:
-        exec_root = Path("/home/project")
-        build_dir = Path("build-out")
-        working_dir = exec_root / build_dir
-        output = Path("hello.txt")
+        output = _HELLO_TXT
         log_base = "debug"
-        p = self._make_main_parser()
+        p = self._main_parser
         command = ["touch", str(output)]
         main_args, other = p.parse_known_args(
             ["--log", log_base, "--"] + command
@@ -1234,20 +1374,20 @@ class RemoteActionMainParserTests(unittest.TestCase):
         action = remote_action.remote_action_from_args(
             main_args,
             output_files=[output],
-            exec_root=exec_root,
-            working_dir=working_dir,
+            exec_root=_EXEC_ROOT,
+            working_dir=_WORKING_DIR,
         )
 
         self.assertEqual(
             [remote_action._REMOTE_LOG_SCRIPT],
             action.inputs_relative_to_project_root,
         )
-        self.assertEqual(
-            {
-                build_dir / output,
-                build_dir / (log_base + ".remote-log"),
-            },
-            set(action.output_files_relative_to_project_root),
+        self.assertCountEqual(
+            [
+                _BUILD_DIR / output,
+                _BUILD_DIR / (log_base + ".remote-log"),
+            ],
+            action.output_files_relative_to_project_root,
         )
         # Ignore the rewrapper portion of the command
         command_slices = list(
@@ -1268,13 +1408,10 @@ class RemoteActionMainParserTests(unittest.TestCase):
         self.assertEqual(main_command, command)
 
     def test_remote_fsatrace_path_default(self) -> None:
-        exec_root = Path("/home/project")
-        build_dir = Path("build-out")
-        working_dir = exec_root / build_dir
-        output = Path("hello.txt")
+        output = _HELLO_TXT
         fake_fsatrace = fuchsia.FSATRACE_PATH
         fake_fsatrace_rel = Path(f"../{fake_fsatrace}")
-        p = self._make_main_parser()
+        p = self._main_parser
         command = ["touch", str(output)]
         # Pass "" to use the default fuchsia.FSATRACE_PATH
         main_args, other = p.parse_known_args(
@@ -1284,20 +1421,20 @@ class RemoteActionMainParserTests(unittest.TestCase):
         action = remote_action.remote_action_from_args(
             main_args,
             output_files=[output],
-            exec_root=exec_root,
-            working_dir=working_dir,
+            exec_root=_EXEC_ROOT,
+            working_dir=_WORKING_DIR,
         )
 
-        self.assertEqual(
-            {fake_fsatrace, fake_fsatrace.with_suffix(".so")},
-            set(action.inputs_relative_to_project_root),
+        self.assertCountEqual(
+            [fake_fsatrace, fake_fsatrace.with_suffix(".so")],
+            action.inputs_relative_to_project_root,
         )
-        self.assertEqual(
-            {
-                build_dir / output,  # relative to exec_root
-                build_dir / (str(output) + ".remote-fsatrace"),
-            },
-            set(action.output_files_relative_to_project_root),
+        self.assertCountEqual(
+            [
+                _BUILD_DIR / output,  # relative to exec_root
+                _BUILD_DIR / _HELLO_TXT_REMOTE_TRACE,
+            ],
+            action.output_files_relative_to_project_root,
         )
         # Ignore the rewrapper portion of the command
         cmd_slices = cl_utils.split_into_subsequences(
@@ -1308,40 +1445,35 @@ class RemoteActionMainParserTests(unittest.TestCase):
         self.assertIn(str(fake_fsatrace_rel), fsatrace_prefix)
         self.assertEqual(
             [*fsatrace_prefix, "--"],
-            action._fsatrace_command_prefix(
-                Path(str(output) + ".remote-fsatrace")
-            ),
+            action._fsatrace_command_prefix(_HELLO_TXT_REMOTE_TRACE),
         )
         self.assertEqual(remote_command, command)
 
     def test_remote_fsatrace_from_main_args(self) -> None:
-        exec_root = Path("/home/project")
-        build_dir = Path("build-out")
-        working_dir = exec_root / build_dir
-        output = Path("hello.txt")
+        output = _HELLO_TXT
         fake_fsatrace = Path("tools/debug/fsatrace")
         fake_fsatrace_rel = Path(f"../{fake_fsatrace}")
-        p = self._make_main_parser()
+        p = self._main_parser
         main_args, other = p.parse_known_args(
             _strs(["--fsatrace-path", fake_fsatrace_rel, "--", "touch", output])
         )
         action = remote_action.remote_action_from_args(
             main_args,
             output_files=[output],
-            exec_root=exec_root,
-            working_dir=working_dir,
+            exec_root=_EXEC_ROOT,
+            working_dir=_WORKING_DIR,
         )
 
-        self.assertEqual(
-            {fake_fsatrace, fake_fsatrace.with_suffix(".so")},
-            set(action.inputs_relative_to_project_root),
+        self.assertCountEqual(
+            [fake_fsatrace, fake_fsatrace.with_suffix(".so")],
+            action.inputs_relative_to_project_root,
         )
-        self.assertEqual(
-            {
-                build_dir / output,
-                build_dir / (str(output) + ".remote-fsatrace"),
-            },
-            set(action.output_files_relative_to_project_root),
+        self.assertCountEqual(
+            [
+                _BUILD_DIR / output,
+                _BUILD_DIR / _HELLO_TXT_REMOTE_TRACE,
+            ],
+            action.output_files_relative_to_project_root,
         )
         # Ignore the rewrapper portion of the command
         command_slices = list(
@@ -1352,21 +1484,16 @@ class RemoteActionMainParserTests(unittest.TestCase):
         self.assertIn(str(fake_fsatrace_rel), trace_wrapper)
         self.assertEqual(
             [*trace_wrapper, "--"],
-            action._fsatrace_command_prefix(
-                Path(str(output) + ".remote-fsatrace")
-            ),
+            action._fsatrace_command_prefix(_HELLO_TXT_REMOTE_TRACE),
         )
         self.assertEqual(main_command, ["touch", str(output)])
 
     def test_remote_log_and_fsatrace_from_main_args(self) -> None:
-        exec_root = Path("/home/project")
-        build_dir = Path("build-out")
-        working_dir = exec_root / build_dir
-        output = Path("hello.txt")
+        output = _HELLO_TXT
         command = ["touch", str(output)]
         fake_fsatrace = Path("tools/debug/fsatrace")
         fake_fsatrace_rel = Path("..", fake_fsatrace)
-        p = self._make_main_parser()
+        p = self._main_parser
         main_args, other = p.parse_known_args(
             _strs(
                 ["--fsatrace-path", fake_fsatrace_rel, "--log", "--"] + command
@@ -1375,25 +1502,25 @@ class RemoteActionMainParserTests(unittest.TestCase):
         action = remote_action.remote_action_from_args(
             main_args,
             output_files=[output],
-            exec_root=exec_root,
-            working_dir=working_dir,
+            exec_root=_EXEC_ROOT,
+            working_dir=_WORKING_DIR,
         )
 
-        self.assertEqual(
-            {
+        self.assertCountEqual(
+            [
                 remote_action._REMOTE_LOG_SCRIPT,
                 fake_fsatrace,
                 fake_fsatrace.with_suffix(".so"),
-            },
-            set(action.inputs_relative_to_project_root),
+            ],
+            action.inputs_relative_to_project_root,
         )
-        self.assertEqual(
-            {
-                build_dir / output,
-                build_dir / (str(output) + ".remote-log"),
-                build_dir / (str(output) + ".remote-fsatrace"),
-            },
-            set(action.output_files_relative_to_project_root),
+        self.assertCountEqual(
+            [
+                _BUILD_DIR / output,
+                _BUILD_DIR / (str(output) + ".remote-log"),
+                _BUILD_DIR / _HELLO_TXT_REMOTE_TRACE,
+            ],
+            action.output_files_relative_to_project_root,
         )
         # Ignore the rewrapper portion of the command
         command_slices = list(
@@ -1419,29 +1546,13 @@ class RemoteActionMainParserTests(unittest.TestCase):
         # Confirm that the inner wrapper is for fsatrace
         self.assertEqual(
             [*trace_wrapper, "--"],
-            action._fsatrace_command_prefix(
-                Path(str(output) + ".remote-fsatrace")
-            ),
+            action._fsatrace_command_prefix(_HELLO_TXT_REMOTE_TRACE),
         )
         self.assertEqual(main_command, command)
 
     def test_local_only_no_compare(self) -> None:
         # --compare does nothing with --local
-        exec_root = Path("/home/project")
-        build_dir = Path("build-out")
-        working_dir = exec_root / build_dir
-        output = Path("hello.txt")
-        base_command = ["touch", str(output)]
-        p = self._make_main_parser()
-        main_args, other = p.parse_known_args(
-            ["--compare", "--local", "--"] + base_command
-        )
-        action = remote_action.remote_action_from_args(
-            main_args,
-            output_files=[output],
-            exec_root=exec_root,
-            working_dir=working_dir,
-        )
+        main_args, action = self._make_compare_action("--local")
         self.assertTrue(action.remote_disable)
         self.assertTrue(action.compare_with_local)
 
@@ -1458,38 +1569,23 @@ class RemoteActionMainParserTests(unittest.TestCase):
         mock_compare.assert_not_called()
 
     def test_compare_forces_remote(self) -> None:
-        exec_root = Path("/home/project")
-        build_dir = Path("build-out")
-        working_dir = exec_root / build_dir
-        output = Path("hello.txt")
-        base_command = ["touch", str(output)]
-        p = self._make_main_parser()
-        main_args, other = p.parse_known_args(
-            ["--compare", "--exec_strategy=local", "--"] + base_command
-        )
-        action = remote_action.remote_action_from_args(
-            main_args,
-            output_files=[output],
-            exec_root=exec_root,
-            working_dir=working_dir,
-        )
+        main_args, action = self._make_compare_action("--exec_strategy=local")
         self.assertFalse(action.remote_disable)
         self.assertTrue(action.compare_with_local)
         self.assertEqual(action.exec_strategy, "remote")  # forced
 
     def test_compare_fsatraces_acceptable_match(self) -> None:
-        exec_root = Path("/home/project")
         build_dir = Path("build/out/here")
-        working_dir = exec_root / build_dir
+        working_dir = _EXEC_ROOT / build_dir
         action = remote_action.RemoteAction(
             rewrapper=Path("/test-build/rewrapper"),
             command=["sleep", "1h"],
             options=["--canonicalize_working_dir=true"],
-            exec_root=exec_root,
+            exec_root=_EXEC_ROOT,
             working_dir=working_dir,
         )
         self.assertTrue(action.canonicalize_working_dir)
-        local_trace_contents = f"""r|{exec_root}/src/input.c
+        local_trace_contents = f"""r|{_EXEC_ROOT}/src/input.c
 w|{working_dir}/obj/input.o
 """
         remote_root = remote_action._REMOTE_PROJECT_ROOT
@@ -1497,32 +1593,30 @@ w|{working_dir}/obj/input.o
 w|{remote_root}/set_by_reclient/a/a/obj/input.o
 """
         self.assertNotEqual(local_trace_contents, remote_trace_contents)
-        with tempfile.TemporaryDirectory() as td:
-            local_trace = Path(td) / "local.trace"
-            remote_trace = Path(td) / "remote.trace"
-            _write_file_contents(local_trace, local_trace_contents)
-            _write_file_contents(remote_trace, remote_trace_contents)
-            diff_text = io.StringIO()
-            with contextlib.redirect_stdout(diff_text):
-                status = action._compare_fsatraces_select_logs(
-                    local_trace=local_trace,
-                    remote_trace=remote_trace,
-                )
+        td = _scratch_dir(self.id())
+        local_trace = td / "local.trace"
+        remote_trace = td / "remote.trace"
+        _write_file_contents(local_trace, local_trace_contents)
+        _write_file_contents(remote_trace, remote_trace_contents)
+        with contextlib.redirect_stdout(self._devnull):
+            status = action._compare_fsatraces_select_logs(
+                local_trace=local_trace,
+                remote_trace=remote_trace,
+            )
         self.assertEqual(status.returncode, 0)  # contents are equivalent
 
     def test_compare_fsatraces_with_difference(self) -> None:
-        exec_root = Path("/home/project")
         build_dir = Path("build/out/here")
-        working_dir = exec_root / build_dir
+        working_dir = _EXEC_ROOT / build_dir
         action = remote_action.RemoteAction(
             rewrapper=Path("/test-build/rewrapper"),
             command=["sleep", "1h"],
             options=["--canonicalize_working_dir=true"],
-            exec_root=exec_root,
+            exec_root=_EXEC_ROOT,
             working_dir=working_dir,
         )
         self.assertTrue(action.canonicalize_working_dir)
-        local_trace_contents = f"""r|{exec_root}/src/input.c
+        local_trace_contents = f"""r|{_EXEC_ROOT}/src/input.c
 w|{working_dir}/obj/input.o
 """
         remote_root = remote_action._REMOTE_PROJECT_ROOT
@@ -1531,63 +1625,49 @@ r|{remote_root}/includes/input.h
 w|{remote_root}/set_by_reclient/a/a/obj/input.o
 """
         self.assertNotEqual(local_trace_contents, remote_trace_contents)
-        with tempfile.TemporaryDirectory() as td:
-            local_trace = Path(td) / "local.trace"
-            remote_trace = Path(td) / "remote.trace"
-            _write_file_contents(local_trace, local_trace_contents)
-            _write_file_contents(remote_trace, remote_trace_contents)
-            diff_text = io.StringIO()
-            with contextlib.redirect_stdout(diff_text):
-                result = action._compare_fsatraces_select_logs(
-                    local_trace=local_trace,
-                    remote_trace=remote_trace,
-                )
+        td = _scratch_dir(self.id())
+        local_trace = td / "local.trace"
+        remote_trace = td / "remote.trace"
+        _write_file_contents(local_trace, local_trace_contents)
+        _write_file_contents(remote_trace, remote_trace_contents)
+        with contextlib.redirect_stdout(self._devnull):
+            result = action._compare_fsatraces_select_logs(
+                local_trace=local_trace,
+                remote_trace=remote_trace,
+            )
         self.assertEqual(result.returncode, 1)  # traces differ
 
-    def test_local_remote_compare_no_diffs_from_main_args(self) -> None:
+    # we don't bother to check the call details of the first few mocks
+    @mock.patch.object(Path, "rename")
+    @mock.patch.object(Path, "is_file", return_value=True)
+    # Pretend comparison finds no differences
+    @mock.patch.object(remote_action, "_files_match", return_value=True)
+    # both local and remote commands succeed
+    @mock.patch.multiple(
+        remote_action.RemoteAction,
+        _run_locally=mock.DEFAULT,
+        _run_maybe_remotely=mock.DEFAULT,
+        _compare_fsatraces=mock.DEFAULT,
+    )
+    @mock.patch.object(os, "remove")
+    def test_local_remote_compare_no_diffs_from_main_args(
+        self,
+        mock_cleanup: mock.MagicMock,
+        *unused_mocks: mock.MagicMock,
+        **run_mocks: mock.MagicMock,
+    ) -> None:
         # Same as test_remote_fsatrace_from_main_args, but with --compare
-        exec_root = Path("/home/project")
-        build_dir = Path("build-out")
-        working_dir = exec_root / build_dir
-        output = Path("hello.txt")
+        mock_local_launch = run_mocks["_run_locally"]
+        mock_local_launch.return_value = 0
+        mock_remote_launch = run_mocks["_run_maybe_remotely"]
+        mock_remote_launch.return_value = _SUCCESS_RESULT
+        mock_compare_traces = run_mocks["_compare_fsatraces"]
+        output = _HELLO_TXT
         base_command = ["touch", str(output)]
-        p = self._make_main_parser()
-        main_args, other = p.parse_known_args(
-            ["--compare", "--"] + base_command
-        )
-        action = remote_action.remote_action_from_args(
-            main_args,
-            output_files=[output],
-            exec_root=exec_root,
-            working_dir=working_dir,
-        )
+        main_args, action = self._make_compare_action()
         self.assertTrue(action.compare_with_local)
 
-        unnamed_mocks = [
-            # we don't bother to check the call details of these mocks
-            mock.patch.object(Path, "rename"),
-            mock.patch.object(Path, "is_file", return_value=True),
-            # Pretend comparison finds no differences
-            mock.patch.object(remote_action, "_files_match", return_value=True),
-        ]
-        with contextlib.ExitStack() as stack:
-            for m in unnamed_mocks:
-                stack.enter_context(m)
-
-            # both local and remote commands succeed
-            with mock.patch.object(
-                remote_action.RemoteAction, "_run_locally", return_value=0
-            ) as mock_local_launch:
-                with mock.patch.object(
-                    remote_action.RemoteAction,
-                    "_run_maybe_remotely",
-                    return_value=cl_utils.SubprocessResult(0),
-                ) as mock_remote_launch:
-                    with mock.patch.object(
-                        remote_action.RemoteAction, "_compare_fsatraces"
-                    ) as mock_compare_traces:
-                        with mock.patch.object(os, "remove") as mock_cleanup:
-                            exit_code = action.run_with_main_args(main_args)
+        exit_code = action.run_with_main_args(main_args)
 
         remote_command = action.launch_command
         self.assertEqual(exit_code, 0)  # remote success and compare success
@@ -1595,54 +1675,38 @@ w|{remote_root}/set_by_reclient/a/a/obj/input.o
         mock_local_launch.assert_called_once()
         mock_remote_launch.assert_called_once()
         self.assertEqual(remote_command[-2:], base_command)
-        mock_cleanup.assert_called_with(Path(str(output) + ".remote"))
-
-    def test_local_remote_compare_found_diffs_from_main_args(self) -> None:
+        mock_cleanup.assert_called_with(_HELLO_TXT_REMOTE)
+
+    # we don't bother to check the call details of these mocks
+    @mock.patch.object(Path, "rename")
+    @mock.patch.object(Path, "is_file", return_value=True)
+    # Pretend comparison finds differences
+    @mock.patch.object(remote_action, "_files_match", return_value=False)
+    @mock.patch.object(remote_action, "_detail_diff")
+    # both local and remote commands succeed
+    @mock.patch.multiple(
+        remote_action.RemoteAction,
+        _run_locally=mock.DEFAULT,
+        _run_maybe_remotely=mock.DEFAULT,
+        _compare_fsatraces=mock.DEFAULT,
+    )
+    def test_local_remote_compare_found_diffs_from_main_args(
+        self,
+        *unused_mocks: mock.MagicMock,
+        **run_mocks: mock.MagicMock,
+    ) -> None:
         # Same as test_remote_fsatrace_from_main_args, but with --compare
-        exec_root = Path("/home/project")
-        build_dir = Path("build-out")
-        working_dir = exec_root / build_dir
-        output = Path("hello.txt")
+        mock_local_launch = run_mocks["_run_locally"]
+        mock_local_launch.return_value = 0
+        mock_remote_launch = run_mocks["_run_maybe_remotely"]
+        mock_remote_launch.return_value = _SUCCESS_RESULT
+        mock_compare_traces = run_mocks["_compare_fsatraces"]
+        output = _HELLO_TXT
         base_command = ["touch", str(output)]
-        p = self._make_main_parser()
-        main_args, other = p.parse_known_args(
-            ["--compare", "--"] + base_command
-        )
-        action = remote_action.remote_action_from_args(
-            main_args,
-            output_files=[output],
-            exec_root=exec_root,
-            working_dir=working_dir,
-        )
+        main_args, action = self._make_compare_action()
         self.assertTrue(action.compare_with_local)
 
-        unnamed_mocks = [
-            # we don't bother to check the call details of these mocks
-            mock.patch.object(Path, "rename"),
-            mock.patch.object(Path, "is_file", return_value=True),
-            # Pretend comparison finds differences
-            mock.patch.object(
-                remote_action, "_files_match", return_value=False
-            ),
-            mock.patch.object(remote_action, "_detail_diff"),
-        ]
-        with contextlib.ExitStack() as stack:
-            for m in unnamed_mocks:
-                stack.enter_context(m)
-
-            # both local and remote commands succeed
-            with mock.patch.object(
-                remote_action.RemoteAction, "_run_locally", return_value=0
-            ) as mock_local_launch:
-                with mock.patch.object(
-                    remote_action.RemoteAction,
-                    "_run_maybe_remotely",
-                    return_value=cl_utils.SubprocessResult(0),
-                ) as mock_remote_launch:
-                    with mock.patch.object(
-                        remote_action.RemoteAction, "_compare_fsatraces"
-                    ) as mock_compare_traces:
-                        exit_code = action.run_with_main_args(main_args)
+        exit_code = action.run_with_main_args(main_args)
 
         remote_command = action.launch_command
         self.assertEqual(exit_code, 1)  # remote success, but compare failure
@@ -1651,68 +1715,52 @@ w|{remote_root}/set_by_reclient/a/a/obj/input.o
         mock_remote_launch.assert_called_once()
         self.assertEqual(remote_command[-2:], base_command)
 
-    def test_local_remote_compare_found_diffs_exported_files(self) -> None:
+    # we don't bother to check the call details of these mocks
+    @mock.patch.object(Path, "rename")
+    @mock.patch.object(Path, "is_file", return_value=True)
+    # Pretend comparison finds differences
+    @mock.patch.object(remote_action, "_files_match", return_value=False)
+    @mock.patch.object(remote_action, "_detail_diff")
+    # both local and remote commands succeed
+    @mock.patch.multiple(
+        remote_action.RemoteAction,
+        _run_locally=mock.DEFAULT,
+        _run_maybe_remotely=mock.DEFAULT,
+        _compare_fsatraces=mock.DEFAULT,
+    )
+    @mock.patch.object(
+        cl_utils,
+        "chdir_cm",
+        return_value=contextlib.nullcontext(),
+    )
+    @mock.patch.object(cl_utils, "copy_preserve_subpath")
+    def test_local_remote_compare_found_diffs_exported_files(
+        self,
+        mock_export: mock.MagicMock,
+        mock_chdir: mock.MagicMock,
+        *unused_mocks: mock.MagicMock,
+        **run_mocks: mock.MagicMock,
+    ) -> None:
         # Checks that miscompared files are exported.
-        exec_root = Path("/home/project")
-        build_dir = Path("build-out")
-        working_dir = exec_root / build_dir
-        output = Path("hello.txt")
+        mock_local_launch = run_mocks["_run_locally"]
+        mock_local_launch.return_value = 0
+        mock_remote_launch = run_mocks["_run_maybe_remotely"]
+        mock_remote_launch.return_value = _SUCCESS_RESULT
+        mock_compare_traces = run_mocks["_compare_fsatraces"]
+        output = _HELLO_TXT
         input = Path("../greet.in")
         export_dir = Path("naughty/diffs")  # relative to working dir
-        export_dir_abs = working_dir / export_dir
+        export_dir_abs = _WORKING_DIR / export_dir
         base_command = ["touch", str(output)]
-        p = self._make_main_parser()
-        main_args, other = p.parse_known_args(
-            ["--compare", f"--miscomparison-export-dir={export_dir}", "--"]
-            + base_command
-        )
-        action = remote_action.remote_action_from_args(
-            main_args,
-            inputs=[input],
-            output_files=[output],
-            exec_root=exec_root,
-            working_dir=working_dir,
+        main_args, action = self._make_compare_action(
+            f"--miscomparison-export-dir={export_dir}", inputs=[input]
         )
         self.assertTrue(action.compare_with_local)
         self.assertEqual(
-            action.miscomparison_export_dir, working_dir / export_dir
+            action.miscomparison_export_dir, _WORKING_DIR / export_dir
         )
 
-        unnamed_mocks = [
-            # we don't bother to check the call details of these mocks
-            mock.patch.object(Path, "rename"),
-            mock.patch.object(Path, "is_file", return_value=True),
-            # Pretend comparison finds differences
-            mock.patch.object(
-                remote_action, "_files_match", return_value=False
-            ),
-            mock.patch.object(remote_action, "_detail_diff"),
-        ]
-        with contextlib.ExitStack() as stack:
-            for m in unnamed_mocks:
-                stack.enter_context(m)
-
-            # both local and remote commands succeed
-            with mock.patch.object(
-                remote_action.RemoteAction, "_run_locally", return_value=0
-            ) as mock_local_launch:
-                with mock.patch.object(
-                    remote_action.RemoteAction,
-                    "_run_maybe_remotely",
-                    return_value=cl_utils.SubprocessResult(0),
-                ) as mock_remote_launch:
-                    with mock.patch.object(
-                        remote_action.RemoteAction, "_compare_fsatraces"
-                    ) as mock_compare_traces:
-                        with mock.patch.object(
-                            cl_utils,
-                            "chdir_cm",
-                            return_value=contextlib.nullcontext(),
-                        ) as mock_chdir:
-                            with mock.patch.object(
-                                cl_utils, "copy_preserve_subpath"
-                            ) as mock_export:
-                                exit_code = action.run_with_main_args(main_args)
+        exit_code = action.run_with_main_args(main_args)
 
         remote_command = action.launch_command
         self.assertEqual(exit_code, 1)  # remote success, but compare failure
@@ -1721,80 +1769,53 @@ w|{remote_root}/set_by_reclient/a/a/obj/input.o
         mock_remote_launch.assert_called_once()
         self.assertEqual(remote_command[-2:], base_command)
         # Make sure we copied the differences to the export dir
-        mock_export.assert_has_calls(
+        self.assertCountEqual(
+            [tuple(c.args) for c in mock_export.call_args_list],
             [
-                mock.call(build_dir / output, export_dir_abs),
-                mock.call(
-                    build_dir / Path(str(output) + ".remote"), export_dir_abs
-                ),
-                mock.call(Path("greet.in"), export_dir_abs),
+                (_BUILD_DIR / output, export_dir_abs),
+                (_BUILD_DIR / _HELLO_TXT_REMOTE, export_dir_abs),
+                (Path("greet.in"), export_dir_abs),
             ],
-            any_order=True,
         )
-        mock_chdir.assert_called_with(exec_root)
-
-    def test_local_remote_compare_with_fsatrace_from_main_args(self) -> None:
+        mock_chdir.assert_called_with(_EXEC_ROOT)
+
+    # we don't bother to check the call details of these mocks
+    @mock.patch.object(Path, "rename")
+    @mock.patch.object(Path, "is_file", return_value=True)
+    # Pretend comparison finds differences
+    @mock.patch.object(remote_action, "_files_match", return_value=False)
+    @mock.patch.object(remote_action, "_detail_diff")
+    # in RemoteAction._compare_fsatraces:
+    @mock.patch.object(remote_action, "_transform_file_by_lines")
+    # both local and remote commands succeed
+    @mock.patch.object(
+        remote_action.RemoteAction, "_run_locally", return_value=0
+    )
+    @_patch_run_maybe_remotely()
+    @mock.patch.object(
+        remote_action,
+        "_text_diff",
+        return_value=cl_utils.SubprocessResult(0),
+    )
+    def test_local_remote_compare_with_fsatrace_from_main_args(
+        self,
+        mock_trace_diff: mock.MagicMock,
+        mock_remote_launch: mock.MagicMock,
+        mock_local_launch: mock.MagicMock,
+        *unused_mocks: mock.MagicMock,
+    ) -> None:
         # Same as test_remote_fsatrace_from_main_args, but with --compare
-        exec_root = Path("/home/project")
-        build_dir = Path("build-out")
-        working_dir = exec_root / build_dir
-        output = Path("hello.txt")
+        output = _HELLO_TXT
         fake_fsatrace = Path("tools/debug/fsatrace")
         fake_fsatrace_rel = Path("..", fake_fsatrace)
-        p = self._make_main_parser()
-        main_args, other = p.parse_known_args(
-            _strs(
-                [
-                    "--compare",
-                    "--fsatrace-path",
-                    fake_fsatrace_rel,
-                    "--",
-                    "touch",
-                    output,
-                ]
-            )
-        )
-        action = remote_action.remote_action_from_args(
-            main_args,
-            output_files=[output],
-            exec_root=exec_root,
-            working_dir=working_dir,
+        main_args, action = self._make_compare_action(
+            "--fsatrace-path", str(fake_fsatrace_rel)
         )
 
         # not repeating the same asserts from
         #   test_remote_fsatrace_from_main_args:
 
-        unnamed_mocks = [
-            # we don't bother to check the call details of these mocks
-            mock.patch.object(Path, "rename"),
-            mock.patch.object(Path, "is_file", return_value=True),
-            # Pretend comparison finds differences
-            mock.patch.object(
-                remote_action, "_files_match", return_value=False
-            ),
-            mock.patch.object(remote_action, "_detail_diff"),
-            # in RemoteAction._compare_fsatraces:
-            mock.patch.object(remote_action, "_transform_file_by_lines"),
-        ]
-        with contextlib.ExitStack() as stack:
-            for m in unnamed_mocks:
-                stack.enter_context(m)
-
-            # both local and remote commands succeed
-            with mock.patch.object(
-                remote_action.RemoteAction, "_run_locally", return_value=0
-            ) as mock_local_launch:
-                with mock.patch.object(
-                    remote_action.RemoteAction,
-                    "_run_maybe_remotely",
-                    return_value=cl_utils.SubprocessResult(0),
-                ) as mock_remote_launch:
-                    with mock.patch.object(
-                        remote_action,
-                        "_text_diff",
-                        return_value=cl_utils.SubprocessResult(0),
-                    ) as mock_trace_diff:
-                        exit_code = action.run_with_main_args(main_args)
+        exit_code = action.run_with_main_args(main_args)
 
         remote_command = action.launch_command
         # make sure local command is also traced
@@ -1804,8 +1825,8 @@ w|{remote_root}/set_by_reclient/a/a/obj/input.o
         mock_local_launch.assert_called_once()
         self.assertIn(str(fake_fsatrace_rel), remote_command)
         self.assertIn(str(fake_fsatrace_rel), local_command)
-        remote_trace = str(output) + ".remote-fsatrace"
-        local_trace = str(output) + ".local-fsatrace"
+        remote_trace = str(_HELLO_TXT_REMOTE_TRACE)
+        local_trace = str(_HELLO_TXT_LOCAL_TRACE)
         self.assertIn(remote_trace, remote_command)
         self.assertIn(local_trace, local_command)
         mock_trace_diff.assert_called_with(
@@ -1813,21 +1834,18 @@ w|{remote_root}/set_by_reclient/a/a/obj/input.o
         )
 
     def test_local_check_determinism(self) -> None:
-        exec_root = Path("/home/project")
-        build_dir = Path("build-out")
-        working_dir = exec_root / build_dir
-        exec_root_rel = cl_utils.relpath(exec_root, start=working_dir)
-        output = Path("hello.txt")
+        exec_root_rel = _EXEC_ROOT_REL
+        output = _HELLO_TXT
         base_command = ["touch", str(output)]
-        p = self._make_main_parser()
+        p = self._main_parser
         main_args, other = p.parse_known_args(
             ["--check-determinism", "--local", "--"] + base_command
         )
         action = remote_action.remote_action_from_args(
             main_args,
             output_files=[output],
-            exec_root=exec_root,
-            working_dir=working_dir,
+            exec_root=_EXEC_ROOT,
+            working_dir=_WORKING_DIR,
         )
         self.assertTrue(action.remote_disable)
 
@@ -1842,7 +1860,7 @@ w|{remote_root}/set_by_reclient/a/a/obj/input.o
         mock_run.assert_called_once()
         args, kwargs = mock_run.call_args_list[0]
         launch_command = args[0]
-        self.assertEqual(kwargs["cwd"], working_dir)
+        self.assertEqual(kwargs["cwd"], _WORKING_DIR)
         check_prefix, sep, main_command = cl_utils.partition_sequence(
             launch_command, "--"
         )
@@ -1858,15 +1876,12 @@ w|{remote_root}/set_by_reclient/a/a/obj/input.o
         self.assertEqual(main_command, base_command)
 
     def test_local_check_determinism_with_export(self) -> None:
-        exec_root = Path("/home/project")
-        build_dir = Path("build-out")
-        working_dir = exec_root / build_dir
-        exec_root_rel = cl_utils.relpath(exec_root, start=working_dir)
-        output = Path("hello.txt")
+        exec_root_rel = _EXEC_ROOT_REL
+        output = _HELLO_TXT
         base_command = ["touch", str(output)]
-        p = self._make_main_parser()
+        p = self._main_parser
         export_dir = Path("saved-diffs")  # relative to working dir
-        export_dir_abs = working_dir / export_dir
+        export_dir_abs = _WORKING_DIR / export_dir
         main_args, other = p.parse_known_args(
             [
                 "--check-determinism",
@@ -1880,12 +1895,12 @@ w|{remote_root}/set_by_reclient/a/a/obj/input.o
         action = remote_action.remote_action_from_args(
             main_args,
             output_files=[output],
-            exec_root=exec_root,
-            working_dir=working_dir,
+            exec_root=_EXEC_ROOT,
+            working_dir=_WORKING_DIR,
         )
         self.assertTrue(action.remote_disable)
         self.assertEqual(
-            action.miscomparison_export_dir, working_dir / export_dir
+            action.miscomparison_export_dir, _WORKING_DIR / export_dir
         )
 
         with mock.patch.object(
@@ -1899,7 +1914,7 @@ w|{remote_root}/set_by_reclient/a/a/obj/input.o
         mock_run.assert_called_once()
         args, kwargs = mock_run.call_args_list[0]
         launch_command = args[0]
-        self.assertEqual(kwargs["cwd"], working_dir)
+        self.assertEqual(kwargs["cwd"], _WORKING_DIR)
         check_prefix, sep, main_command = cl_utils.partition_sequence(
             launch_command, "--"
         )
@@ -1909,7 +1924,7 @@ w|{remote_root}/set_by_reclient/a/a/obj/input.o
         )
         self.assertIn("--check-repeatability", check_prefix)
         # Make sure export dir argument is forwarded.
-        export_out_dir = export_dir_abs / build_dir
+        export_out_dir = export_dir_abs / _BUILD_DIR
         self.assertIn(
             f"--miscomparison-export-dir={export_out_dir}", check_prefix
         )
@@ -1920,11 +1935,8 @@ w|{remote_root}/set_by_reclient/a/a/obj/input.o
         self.assertEqual(main_command, base_command)
 
     def test_output_leak_scan_with_canonical_working_dir_mocked(self) -> None:
-        exec_root = Path("/home/project")
-        build_dir = Path("build-out")
-        working_dir = exec_root / build_dir
         canonical_dir_option = "--canonicalize_working_dir=true"
-        p = self._make_main_parser()
+        p = self._main_parser
         command = ["echo"]
         main_args, other = p.parse_known_args(
             [canonical_dir_option, "--"] + command
@@ -1932,8 +1944,8 @@ w|{remote_root}/set_by_reclient/a/a/obj/input.o
         action = remote_action.remote_action_from_args(
             main_args,
             remote_options=other,
-            exec_root=exec_root,
-            working_dir=working_dir,
+            exec_root=_EXEC_ROOT,
+            working_dir=_WORKING_DIR,
         )
         self.assertEqual(action.local_only_command, command)
         self.assertTrue(action.canonicalize_working_dir)
@@ -1941,11 +1953,7 @@ w|{remote_root}/set_by_reclient/a/a/obj/input.o
         with mock.patch.object(
             output_leak_scanner, "preflight_checks", return_value=0
         ) as mock_scan:
-            with mock.patch.object(
-                remote_action.RemoteAction,
-                "_run_maybe_remotely",
-                return_value=cl_utils.SubprocessResult(0),
-            ) as mock_run:
+            with _patch_run_maybe_remotely() as mock_run:
                 exit_code = action.run()
         self.assertEqual(exit_code, 0)
         mock_scan.assert_called_with(
@@ -1956,10 +1964,9 @@ w|{remote_root}/set_by_reclient/a/a/obj/input.o
         mock_run.assert_called()
 
     def test_output_leak_scan_skipped_when_build_subdir_is_dot(self) -> None:
-        exec_root = Path("/home/project")
-        working_dir = exec_root  # build_subdir == '.'
+        working_dir = _EXEC_ROOT  # build_subdir == '.'
         canonical_dir_option = "--canonicalize_working_dir=true"
-        p = self._make_main_parser()
+        p = self._main_parser
         command = ["echo"]
         main_args, other = p.parse_known_args(
             [canonical_dir_option, "--"] + command
@@ -1967,7 +1974,7 @@ w|{remote_root}/set_by_reclient/a/a/obj/input.o
         action = remote_action.remote_action_from_args(
             main_args,
             remote_options=other,
-            exec_root=exec_root,
+            exec_root=_EXEC_ROOT,
             working_dir=working_dir,
         )
         self.assertEqual(action.local_only_command, command)
@@ -1976,22 +1983,15 @@ w|{remote_root}/set_by_reclient/a/a/obj/input.o
         with mock.patch.object(
             output_leak_scanner, "preflight_checks", return_value=0
         ) as mock_scan:
-            with mock.patch.object(
-                remote_action.RemoteAction,
-                "_run_maybe_remotely",
-                return_value=cl_utils.SubprocessResult(0),
-            ) as mock_run:
+            with _patch_run_maybe_remotely() as mock_run:
                 exit_code = action.run()
         self.assertEqual(exit_code, 0)
         mock_scan.assert_not_called()
         mock_run.assert_called()
 
     def test_output_leak_scan_with_canonical_working_dir_called(self) -> None:
-        exec_root = Path("/home/project")
-        build_dir = Path("build-out")
-        working_dir = exec_root / build_dir
         canonical_dir_option = "--canonicalize_working_dir=true"
-        p = self._make_main_parser()
+        p = self._main_parser
         command = ["echo"]
         main_args, other = p.parse_known_args(
             [canonical_dir_option, "--"] + command
@@ -1999,45 +1999,34 @@ w|{remote_root}/set_by_reclient/a/a/obj/input.o
         action = remote_action.remote_action_from_args(
             main_args,
             remote_options=other,
-            exec_root=exec_root,
-            working_dir=working_dir,
+            exec_root=_EXEC_ROOT,
+            working_dir=_WORKING_DIR,
         )
         self.assertEqual(action.local_only_command, command)
         self.assertTrue(action.canonicalize_working_dir)
         self.assertIn(canonical_dir_option, action.options)
-        with mock.patch.object(
-            remote_action.RemoteAction,
-            "_run_maybe_remotely",
-            return_value=cl_utils.SubprocessResult(0),
-        ) as mock_run:
+        with _patch_run_maybe_remotely() as mock_run:
             exit_code = action.run()
         self.assertEqual(exit_code, 0)
         mock_run.assert_called()
 
     def test_output_leak_scan_with_error_stops_run(self) -> None:
-        exec_root = Path("/home/project")
-        build_dir = Path("build-out")
-        working_dir = exec_root / build_dir
         canonical_dir_option = "--canonicalize_working_dir=true"
-        p = self._make_main_parser()
-        command = ["echo", str(build_dir)]  # command leaks build_dir
+        p = self._main_parser
+        command = ["echo", str(_BUILD_DIR)]  # command leaks build_dir
         main_args, other = p.parse_known_args(
             [canonical_dir_option, "--"] + command
         )
         action = remote_action.remote_action_from_args(
             main_args,
             remote_options=other,
-            exec_root=exec_root,
-            working_dir=working_dir,
+            exec_root=_EXEC_ROOT,
+            working_dir=_WORKING_DIR,
         )
         self.assertEqual(action.local_only_command, command)
         self.assertTrue(action.canonicalize_working_dir)
         self.assertIn(canonical_dir_option, action.options)
-        with mock.patch.object(
-            remote_action.RemoteAction,
-            "_run_maybe_remotely",
-            return_value=cl_utils.SubprocessResult(0),
-        ) as mock_run:
+        with _patch_run_maybe_remotely() as mock_run:
             exit_code = action.run()
         self.assertEqual(exit_code, 1)  # due to output_leak_scanner
         # The output_leak_scan error stopped execution.
@@ -2173,6 +2162,10 @@ class RemoteActionFlagParserTests(unittest.TestCase):
 class RemoteActionConstructionTests(unittest.TestCase):
     _PROJECT_ROOT = Path("/my/project/root")
     _WORKING_DIR = _PROJECT_ROOT / "build_dir"
+    # For the test_path_setup_* tests.
+    _FAKE_ROOT = Path("/home/project")
+    _FAKE_BUILDDIR = Path("out/not-default")
+    _FAKE_CWD = _FAKE_ROOT / _FAKE_BUILDDIR
 
     @property
     def _rewrapper(self) -> Path:
@@ -2217,72 +2210,62 @@ class RemoteActionConstructionTests(unittest.TestCase):
 
     def test_path_setup_implicit(self) -> None:
         command = ["beep", "boop"]
-        fake_root = Path("/home/project")
-        fake_builddir = Path("out/not-default")
-        fake_cwd = fake_root / fake_builddir
-        with mock.patch.object(os, "curdir", fake_cwd):
-            with mock.patch.object(remote_action, "PROJECT_ROOT", fake_root):
+        with mock.patch.object(os, "curdir", self._FAKE_CWD):
+            with mock.patch.object(
+                remote_action, "PROJECT_ROOT", self._FAKE_ROOT
+            ):
                 action = remote_action.RemoteAction(
                     rewrapper=self._rewrapper,
                     command=command,
                 )
-                self.assertEqual(action.exec_root, fake_root)
+                self.assertEqual(action.exec_root, self._FAKE_ROOT)
                 self.assertEqual(action.exec_root_rel, Path("../.."))
-                self.assertEqual(action.build_subdir, fake_builddir)
+                self.assertEqual(action.build_subdir, self._FAKE_BUILDDIR)
 
     def test_path_setup_explicit_exec_root(self) -> None:
         command = ["beep", "boop"]
-        fake_root = Path("/home/project")
-        fake_builddir = Path("out/not-default")
-        fake_cwd = fake_root / fake_builddir
-        with mock.patch.object(os, "curdir", fake_cwd):
+        with mock.patch.object(os, "curdir", self._FAKE_CWD):
             action = remote_action.RemoteAction(
                 rewrapper=self._rewrapper,
                 command=command,
-                exec_root=fake_root,
+                exec_root=self._FAKE_ROOT,
             )
-            self.assertEqual(action.exec_root, fake_root)
+            self.assertEqual(action.exec_root, self._FAKE_ROOT)
             self.assertEqual(action.exec_root_rel, Path("../.."))
-            self.assertEqual(action.build_subdir, fake_builddir)
+            self.assertEqual(action.build_subdir, self._FAKE_BUILDDIR)
 
     def test_path_setup_explicit_exec_root_and_working_dir(self) -> None:
         command = ["beep", "boop"]
-        fake_root = Path("/home/project")
-        fake_builddir = Path("out/not-default")
-        fake_cwd = fake_root / fake_builddir
         action = remote_action.RemoteAction(
             rewrapper=self._rewrapper,
             command=command,
-            exec_root=fake_root,
-            working_dir=fake_cwd,
+            exec_root=self._FAKE_ROOT,
+            working_dir=self._FAKE_CWD,
         )
-        self.assertEqual(action.exec_root, fake_root)
+        self.assertEqual(action.exec_root, self._FAKE_ROOT)
         self.assertEqual(action.exec_root_rel, Path("../.."))
-        self.assertEqual(action.build_subdir, fake_builddir)
-        self.assertEqual(action.working_dir, fake_cwd)
+        self.assertEqual(action.build_subdir, self._FAKE_BUILDDIR)
+        self.assertEqual(action.working_dir, self._FAKE_CWD)
         self.assertFalse(action.canonicalize_working_dir)
-        self.assertEqual(action.remote_build_subdir, fake_builddir)
+        self.assertEqual(action.remote_build_subdir, self._FAKE_BUILDDIR)
         self.assertEqual(
             action.remote_working_dir,
-            remote_action._REMOTE_PROJECT_ROOT / fake_builddir,
+            remote_action._REMOTE_PROJECT_ROOT / self._FAKE_BUILDDIR,
         )
 
     def test_path_setup_explicit_canonicalize_working_dir(self) -> None:
         command = ["b33p", "b00p"]
-        fake_root = Path("/home/project")
-        fake_builddir = Path("out/not-default")
-        fake_cwd = fake_root / fake_builddir
         action = remote_action.RemoteAction(
             rewrapper=self._rewrapper,
             options=["--canonicalize_working_dir=true"],
             command=command,
-            exec_root=fake_root,
-            working_dir=fake_cwd,
+            exec_root=self._FAKE_ROOT,
+            working_dir=self._FAKE_CWD,
         )
-        self.assertEqual(action.exec_root, fake_root)
+        self.assertEqual(action.exec_root, self._FAKE_ROOT)
         self.assertEqual(action.exec_root_rel, Path("../.."))
-        self.assertEqual(action.build_subdir, fake_builddir)
-        self.assertEqual(action.working_dir, fake_cwd)
+        self.assertEqual(action.build_subdir, self._FAKE_BUILDDIR)
+        self.assertEqual(action.working_dir, self._FAKE_CWD)
         self.assertTrue(action.canonicalize_working_dir)
         remote_builddir = Path("set_by_reclient/a")
         self.assertEqual(action.remote_build_subdir, remote_builddir)
@@ -2295,21 +2278,21 @@ class RemoteActionConstructionTests(unittest.TestCase):
         command = ["cat", "../src/meow.txt"]
         action = self._make_remote_action(
             command=command,
-            inputs=_paths(["../src/meow.txt"]),
-            output_files=_paths(["obj/woof.txt"]),
-            output_dirs=_paths([".debug"]),
+            inputs=[Path("../src/meow.txt")],
+            output_files=[Path("obj/woof.txt")],
+            output_dirs=[Path(".debug")],
         )
         self.assertEqual(action.build_subdir, Path("build_dir"))
         self.assertEqual(
-            action.inputs_relative_to_project_root, _paths(["src/meow.txt"])
+            action.inputs_relative_to_project_root, [Path("src/meow.txt")]
         )
         self.assertEqual(
             action.output_files_relative_to_project_root,
-            _paths(["build_dir/obj/woof.txt"]),
+            [Path("build_dir/obj/woof.txt")],
         )
         self.assertEqual(
             action.output_dirs_relative_to_project_root,
-            _paths(["build_dir/.debug"]),
+            [Path("build_dir/.debug")],
         )
         with mock.patch.object(
             remote_action.RemoteAction,
@@ -2330,11 +2313,7 @@ class RemoteActionConstructionTests(unittest.TestCase):
                 ],
             )
             mock_input_list_file.assert_called_once()
-            with mock.patch.object(
-                remote_action.RemoteAction,
-                "_run_maybe_remotely",
-                return_value=cl_utils.SubprocessResult(0),
-            ) as mock_call:
+            with _patch_run_maybe_remotely() as mock_call:
                 with mock.patch.object(
                     remote_action.RemoteAction, "_cleanup"
                 ) as mock_cleanup:
@@ -2351,11 +2330,7 @@ class RemoteActionConstructionTests(unittest.TestCase):
         self.assertEqual(action.local_only_command, command)
         self.assertEqual(action.exec_root, self._PROJECT_ROOT)
         self.assertTrue(action.save_temps)
-        with mock.patch.object(
-            remote_action.RemoteAction,
-            "_run_maybe_remotely",
-            return_value=cl_utils.SubprocessResult(0),
-        ) as mock_call:
+        with _patch_run_maybe_remotely() as mock_call:
             with mock.patch.object(
                 remote_action.RemoteAction, "_cleanup"
             ) as mock_cleanup:
@@ -2452,6 +2427,23 @@ class RemoteActionConstructionTests(unittest.TestCase):
             "jen/project/include/foo.h",
         )
 
+    def test_relativize_deps_outside_roots_unchanged(self) -> None:
+        exec_root = Path("/exec/root")
+        action = self._make_remote_action(
+            command=["cat"],
+            exec_root=exec_root,
+            working_dir=exec_root / "work",
+        )
+        for path in (
+            "/usr/include/stdio.h",
+            "/exec/rootless/foo.h",  # shares a string prefix with exec_root
+        ):
+            with mock.patch.object(remote_action, "msg") as mock_msg:
+                self.assertEqual(
+                    action._relativize_remote_or_local_deps(path), path
+                )
+            mock_msg.assert_called_once()
+
     def test_remote_fail_no_retry(self) -> None:
         command = ["echo", "hello"]
         action = self._make_remote_action(command=command)
@@ -2665,49 +2657,58 @@ class RemoteActionConstructionTests(unittest.TestCase):
         )
 
 
-def _fake_downloader() -> remotetool.RemoteTool:
-    return remotetool.RemoteTool(
-        reproxy_cfg={
-            "service": "foo.buildservice:443",
-            "instance": "my-project/remote/instances/default",
-        }
-    )
+_UPDATE_STUB_DOWNLOAD_OPTION = "--download_outputs=false"
+_UPDATE_STUB_COMMAND = ["echo"]
 
 
-_FAKE_DOWNLOADER = _fake_downloader()
+class DownloadStubsTests(_PatchingTestCase):
+    _update_stub_main_args: argparse.Namespace
+    _update_stub_remote_options: List[str]
 
+    @classmethod
+    def setUpClass(cls) -> None:
+        # All of the _setup_update_stub_test() tests use the same flags,
+        # which remote_action_from_args() only reads, so parse them once.
+        (
+            cls._update_stub_main_args,
+            cls._update_stub_remote_options,
+        ) = remote_action._MAIN_ARG_PARSER.parse_known_args(
+            [
+                _UPDATE_STUB_DOWNLOAD_OPTION,
+                "--preserve_unchanged_output_mtime",
+                "--",
+                *_UPDATE_STUB_COMMAND,
+            ]
+        )
 
-class DownloadStubsTests(unittest.TestCase):
     def test_create_stub_for_nonexistent_ignored(self) -> None:
-        with tempfile.TemporaryDirectory() as td:
-            tdp = Path(td)
-            p = Path("crash_logs/optional-log.txt")
-            (tdp / p.parent).mkdir(parents=True, exist_ok=True)
-            rrpl = tdp / "action_log.rrpl"
-            rrpl_contents = """
+        tdp = _scratch_dir(self.id())
+        p = Path("crash_logs/optional-log.txt")
+        (tdp / p.parent).mkdir(parents=True, exist_ok=True)
+        rrpl = tdp / "action_log.rrpl"
+        rrpl_contents = """
 command: {
 }
 remote_metadata: {
   action_digest: "bef09123babc23/2037"
 }
 """
-            _write_file_contents(rrpl, rrpl_contents)
-            build_id = "xyzzy"
-            log_record = remote_action.ReproxyLogEntry.parse_action_log(rrpl)
-            stub_infos = log_record.make_download_stubs(
-                files=[p], dirs=[], build_id=build_id
-            )
-            # `p` was an optional output that was not created by the action.
-            self.assertEqual(stub_infos, {})
+        _write_file_contents(rrpl, rrpl_contents)
+        build_id = "xyzzy"
+        log_record = remote_action.ReproxyLogEntry.parse_action_log(rrpl)
+        stub_infos = log_record.make_download_stubs(
+            files=[p], dirs=[], build_id=build_id
+        )
+        # `p` was an optional output that was not created by the action.
+        self.assertEqual(stub_infos, {})
 
     def test_create_file_stub_and_download(self) -> None:
-        with tempfile.TemporaryDirectory() as td:
-            tdp = Path(td)
-            p = Path("dir/big-file.txt")
-            (tdp / p.parent).mkdir(parents=True, exist_ok=True)
-            digest = "abc123abc123/343"
-            rrpl = tdp / "action_log.rrpl"
-            rrpl_contents = f"""
+        tdp = _scratch_dir(self.id())
+        p = Path("dir/big-file.txt")
+        (tdp / p.parent).mkdir(parents=True, exist_ok=True)
+        digest = "abc123abc123/343"
+        rrpl = tdp / "action_log.rrpl"
+        rrpl_contents = f"""
 command: {{
 }}
 remote_metadata: {{
@@ -2718,47 +2719,46 @@ remote_metadata: {{
   }}
 }}
 """
-            _write_file_contents(rrpl, rrpl_contents)
-            build_id = "xyzzy"
-            log_record = remote_action.ReproxyLogEntry.parse_action_log(rrpl)
-            stub_infos = log_record.make_download_stubs(
-                files=[p], dirs=[], build_id=build_id
-            )
+        _write_file_contents(rrpl, rrpl_contents)
+        build_id = "xyzzy"
+        log_record = remote_action.ReproxyLogEntry.parse_action_log(rrpl)
+        stub_infos = log_record.make_download_stubs(
+            files=[p], dirs=[], build_id=build_id
+        )
 
-            self.assertEqual(len(stub_infos), 1)
-            stub_infos[p].create(tdp)
+        self.assertEqual(len(stub_infos), 1)
+        stub_infos[p].create(tdp)
 
-            destination = tdp / p
-            mode = destination.stat().st_mode
-            self.assertTrue(remote_action.is_download_stub_file(destination))
+        destination = tdp / p
+        mode = destination.stat().st_mode
+        self.assertTrue(remote_action.is_download_stub_file(destination))
 
-            def fake_download_file(
-                downloader_self: object, path: Path, digest: str, **kwargs: Any
-            ) -> cl_utils.SubprocessResult:
-                (tdp / path).write_text("hello\n")
-                return cl_utils.SubprocessResult(0)
+        def fake_download_file(
+            downloader_self: object, path: Path, digest: str, **kwargs: Any
+        ) -> cl_utils.SubprocessResult:
+            (tdp / path).write_text("hello\n")
+            return cl_utils.SubprocessResult(0)
 
-            with mock.patch.object(
-                remotetool.RemoteTool, "download_blob", new=fake_download_file
-            ) as mock_download:
-                with mock.patch.object(Path, "rename") as mock_rename:
-                    remote_action.download_from_stub_path(
-                        destination,
-                        downloader=_FAKE_DOWNLOADER,
-                        working_dir_abs=tdp,
-                    )
+        with mock.patch.object(
+            remotetool.RemoteTool, "download_blob", new=fake_download_file
+        ) as mock_download:
+            with mock.patch.object(Path, "rename") as mock_rename:
+                remote_action.download_from_stub_path(
+                    destination,
+                    downloader=_FAKE_DOWNLOADER,
+                    working_dir_abs=tdp,
+                )
 
-            mock_rename.assert_called_with(destination)
-            self.assertEqual(destination.stat().st_mode, mode)
+        mock_rename.assert_called_with(destination)
+        self.assertEqual(destination.stat().st_mode, mode)
 
     def test_create_directory_stub_and_download(self) -> None:
-        with tempfile.TemporaryDirectory() as td:
-            tdp = Path(td)
-            p = Path("bag/of/goodies")
-            (tdp / p.parent).mkdir(parents=True, exist_ok=True)
-            digest = "09ab9c86d8f001a/6540"
-            rrpl = tdp / "action_log-2.rrpl"
-            rrpl_contents = f"""
+        tdp = _scratch_dir(self.id())
+        p = Path("bag/of/goodies")
+        (tdp / p.parent).mkdir(parents=True, exist_ok=True)
+        digest = "09ab9c86d8f001a/6540"
+        rrpl = tdp / "action_log-2.rrpl"
+        rrpl_contents = f"""
 command: {{
 }}
 remote_metadata: {{
@@ -2769,42 +2769,42 @@ remote_metadata: {{
   }}
 }}
 """
-            _write_file_contents(rrpl, rrpl_contents)
-            build_id = "yzzyx"
-            log_record = remote_action.ReproxyLogEntry.parse_action_log(rrpl)
-            stub_infos = log_record.make_download_stubs(
-                files=[], dirs=[p], build_id=build_id
-            )
-            self.assertEqual(len(stub_infos), 1)
-            stub_infos[p].create(tdp)
+        _write_file_contents(rrpl, rrpl_contents)
+        build_id = "yzzyx"
+        log_record = remote_action.ReproxyLogEntry.parse_action_log(rrpl)
+        stub_infos = log_record.make_download_stubs(
+            files=[], dirs=[p], build_id=build_id
+        )
+        self.assertEqual(len(stub_infos), 1)
+        stub_infos[p].create(tdp)
 
-            destination = tdp / p
-            self.assertTrue(remote_action.is_download_stub_file(destination))
+        destination = tdp / p
+        self.assertTrue(remote_action.is_download_stub_file(destination))
 
-            def fake_download_dir(
-                downloader_self: object, path: Path, digest: str, **kwargs: Any
-            ) -> cl_utils.SubprocessResult:
-                (tdp / path).mkdir()
-                (tdp / path / "readme.txt").write_text("hello\n")
-                return cl_utils.SubprocessResult(0)
+        def fake_download_dir(
+            downloader_self: object, path: Path, digest: str, **kwargs: Any
+        ) -> cl_utils.SubprocessResult:
+            (tdp / path).mkdir()
+            (tdp / path / "readme.txt").write_text("hello\n")
+            return cl_utils.SubprocessResult(0)
 
-            with mock.patch.object(
-                remotetool.RemoteTool, "download_dir", new=fake_download_dir
-            ) as mock_download:
-                with mock.patch.object(Path, "rename") as mock_rename:
-                    remote_action.download_from_stub_path(
-                        destination,
-                        downloader=_FAKE_DOWNLOADER,
-                        working_dir_abs=tdp,
-                    )
-            mock_rename.assert_called_with(destination)
+        with mock.patch.object(
+            remotetool.RemoteTool, "download_dir", new=fake_download_dir
+        ) as mock_download:
+            with mock.patch.object(Path, "rename") as mock_rename:
+                remote_action.download_from_stub_path(
+                    destination,
+                    downloader=_FAKE_DOWNLOADER,
+                    working_dir_abs=tdp,
+                )
+        mock_rename.assert_called_with(destination)
 
     def test_read_fail(self) -> None:
-        with tempfile.TemporaryDirectory() as td:
-            stub_file = Path(td) / "testing.stub"
-            _write_file_contents(stub_file, "#!/bin/sh\nnot a stub file\n")
-            with self.assertRaises(remote_action.DownloadStubFormatError):
-                remote_action.DownloadStubInfo.read_from_file(stub_file)
+        td = _scratch_dir(self.id())
+        stub_file = td / "testing.stub"
+        _write_file_contents(stub_file, "#!/bin/sh\nnot a stub file\n")
+        with self.assertRaises(remote_action.DownloadStubFormatError):
+            remote_action.DownloadStubInfo.read_from_file(stub_file)
 
     def test_stub_write_read_match(self) -> None:
         stub = remote_action.DownloadStubInfo(
@@ -2814,10 +2814,10 @@ remote_metadata: {{
             action_digest="08871bc3d1/18",
             build_id="random-id888",
         )
-        with tempfile.TemporaryDirectory() as td:
-            stub_file = Path(td) / "identity.stub"
-            stub._write(stub_file)
-            new_stub = remote_action.DownloadStubInfo.read_from_file(stub_file)
+        td = _scratch_dir(self.id())
+        stub_file = td / "identity.stub"
+        stub._write(stub_file)
+        new_stub = remote_action.DownloadStubInfo.read_from_file(stub_file)
 
         self.assertEqual(stub, new_stub)
 
@@ -2830,12 +2830,12 @@ remote_metadata: {{
             action_digest="08871bc3d1/18",
             build_id="random-id888",
         )
-        with tempfile.TemporaryDirectory() as td:
-            full_path = td / path
-            stub.create(working_dir_abs=Path(td))
-            self.assertTrue(remote_action.is_download_stub_file(full_path))
-            read_back = remote_action.DownloadStubInfo.read_from_file(full_path)
-            self.assertEqual(read_back, stub)
+        td = _scratch_dir(self.id())
+        full_path = td / path
+        stub.create(working_dir_abs=td)
+        self.assertTrue(remote_action.is_download_stub_file(full_path))
+        read_back = remote_action.DownloadStubInfo.read_from_file(full_path)
+        self.assertEqual(read_back, stub)
 
     def test_download_to_alt_dest(self) -> None:
         blob_digest = "00111ddeee000aa/24"
@@ -2953,9 +2953,6 @@ remote_metadata: {{
         mock_rename.assert_not_called()
 
     def test_download_output_file(self) -> None:
-        exec_root = Path("/home/project")
-        build_dir = Path("build-out")
-        working_dir = exec_root / build_dir
         p = remote_action._MAIN_ARG_PARSER
         command = ["echo"]
         output = "out.out"
@@ -2963,8 +2960,8 @@ remote_metadata: {{
         action = remote_action.remote_action_from_args(
             main_args,
             remote_options=other,
-            exec_root=exec_root,
-            working_dir=working_dir,
+            exec_root=_EXEC_ROOT,
+            working_dir=_WORKING_DIR,
             output_files=[Path(output)],
         )
         self.assertEqual(action.local_only_command, command)
@@ -2995,10 +2992,48 @@ remote_metadata: {{
         mock_download.assert_called_once()
         mock_downloader.assert_called_once_with()
 
+    def _run_with_fake_log_record(
+        self,
+        action: remote_action.RemoteAction,
+        log_record: remote_action.ReproxyLogEntry,
+        logdir: Optional[str] = None,
+        mock_download_inputs: bool = False,
+    ) -> Tuple[int, Dict[str, mock.MagicMock]]:
+        """Runs action with faked remote execution and reproxy log.
+
+        Args:
+          logdir: if set, fake the reproxy log dir with this value.
+          mock_download_inputs: if True, fake RemoteAction.download_inputs().
+
+        Returns:
+          The exit code, and the mocks keyed by the attribute they replace.
+        """
+        mocks = {
+            "parse_action_log": self._patch_mock(
+                remote_action.ReproxyLogEntry,
+                "parse_action_log",
+                return_value=log_record,
+            ),
+            "make_download_stubs": self._patch_mock(
+                remote_action.ReproxyLogEntry, "make_download_stubs"
+            ),
+            "_run_maybe_remotely": self._patch_mock(
+                remote_action.RemoteAction,
+                "_run_maybe_remotely",
+                return_value=_SUCCESS_RESULT,
+            ),
+        }
+        if logdir is not None:
+            mocks["_reproxy_log_dir"] = self._patch_mock(
+                remote_action, "_reproxy_log_dir", return_value=logdir
+            )
+        if mock_download_inputs:
+            mocks["download_inputs"] = self._patch_mock(
+                remote_action.RemoteAction, "download_inputs", return_value={}
+            )
+        return action.run(), mocks
+
     def test_made_download_stubs_for_remote_execution(self) -> None:
-        exec_root = Path("/home/project")
-        build_dir = Path("build-out")
-        working_dir = exec_root / build_dir
         download_option = "--download_outputs=false"
         p = remote_action._MAIN_ARG_PARSER
         command = ["echo"]
@@ -3007,8 +3042,8 @@ remote_metadata: {{
         action = remote_action.remote_action_from_args(
             main_args,
             remote_options=other,
-            exec_root=exec_root,
-            working_dir=working_dir,
+            exec_root=_EXEC_ROOT,
+            working_dir=_WORKING_DIR,
             output_files=[Path(output)],
         )
         self.assertEqual(action.local_only_command, command)
@@ -3018,37 +3053,20 @@ remote_metadata: {{
         self.assertIn(download_option, options)
         logdir = "/fake/tmp/rpl/logz.932874"
         fake_log_record = FakeReproxyLogEntry(completion_status="SUCCESS")
-        with mock.patch.object(
-            remote_action, "_reproxy_log_dir", return_value=logdir
-        ) as mock_log_dir:
-            with mock.patch.object(
-                remote_action.ReproxyLogEntry,
-                "parse_action_log",
-                return_value=fake_log_record,
-            ) as mock_parse_log:
-                with mock.patch.object(
-                    remote_action.ReproxyLogEntry, "make_download_stubs"
-                ) as mock_stub:
-                    with mock.patch.object(
-                        remote_action.RemoteAction,
-                        "_run_maybe_remotely",
-                        return_value=cl_utils.SubprocessResult(0),
-                    ) as mock_run:
-                        exit_code = action.run()
-            self.assertEqual(exit_code, 0)
-        mock_run.assert_called()
-        mock_log_dir.assert_called_once()
-        mock_parse_log.assert_called_with(Path(output + ".rrpl"))
-        mock_stub.assert_called_with(
+        exit_code, mocks = self._run_with_fake_log_record(
+            action, fake_log_record, logdir=logdir
+        )
+        self.assertEqual(exit_code, 0)
+        mocks["_run_maybe_remotely"].assert_called()
+        mocks["_reproxy_log_dir"].assert_called_once()
+        mocks["parse_action_log"].assert_called_with(Path(output + ".rrpl"))
+        mocks["make_download_stubs"].assert_called_with(
             files=[Path(output)],
             dirs=[],
             build_id=Path(logdir).name,
         )
 
     def test_made_download_stubs_for_racing_remote_win(self) -> None:
-        exec_root = Path("/home/project")
-        build_dir = Path("build-out")
-        working_dir = exec_root / build_dir
         download_option = "--download_outputs=false"
         p = remote_action._MAIN_ARG_PARSER
         command = ["echo"]
@@ -3059,8 +3077,8 @@ remote_metadata: {{
         action = remote_action.remote_action_from_args(
             main_args,
             remote_options=other,
-            exec_root=exec_root,
-            working_dir=working_dir,
+            exec_root=_EXEC_ROOT,
+            working_dir=_WORKING_DIR,
             output_files=[Path(output)],
         )
         self.assertEqual(action.local_only_command, command)
@@ -3072,41 +3090,21 @@ remote_metadata: {{
         fake_log_record = FakeReproxyLogEntry(
             completion_status="STATUS_CACHE_HIT"
         )
-        with mock.patch.object(
-            remote_action, "_reproxy_log_dir", return_value=logdir
-        ) as mock_log_dir:
-            with mock.patch.object(
-                remote_action.RemoteAction, "download_inputs", return_value={}
-            ) as mock_download_inputs:
-                with mock.patch.object(
-                    remote_action.ReproxyLogEntry,
-                    "parse_action_log",
-                    return_value=fake_log_record,
-                ) as mock_parse_log:
-                    with mock.patch.object(
-                        remote_action.ReproxyLogEntry, "make_download_stubs"
-                    ) as mock_stub:
-                        with mock.patch.object(
-                            remote_action.RemoteAction,
-                            "_run_maybe_remotely",
-                            return_value=cl_utils.SubprocessResult(0),
-                        ) as mock_run:
-                            exit_code = action.run()
-                self.assertEqual(exit_code, 0)
-        mock_run.assert_called()
-        mock_download_inputs.assert_called_once()
-        mock_log_dir.assert_called_once()
-        mock_parse_log.assert_called_with(Path(output + ".rrpl"))
-        mock_stub.assert_called_with(
+        exit_code, mocks = self._run_with_fake_log_record(
+            action, fake_log_record, logdir=logdir, mock_download_inputs=True
+        )
+        self.assertEqual(exit_code, 0)
+        mocks["_run_maybe_remotely"].assert_called()
+        mocks["download_inputs"].assert_called_once()
+        mocks["_reproxy_log_dir"].assert_called_once()
+        mocks["parse_action_log"].assert_called_with(Path(output + ".rrpl"))
+        mocks["make_download_stubs"].assert_called_with(
             files=[Path(output)],
             dirs=[],
             build_id=Path(logdir).name,
         )
 
     def test_download_inputs_for_local_execution(self) -> None:
-        exec_root = Path("/home/project")
-        build_dir = Path("build-out")
-        working_dir = exec_root / build_dir
         p = remote_action._MAIN_ARG_PARSER
         command = ["echo"]
         input_file = Path("in.in")  # pretend this is a download stub
@@ -3117,8 +3115,8 @@ remote_metadata: {{
         action = remote_action.remote_action_from_args(
             main_args,
             remote_options=other,
-            exec_root=exec_root,
-            working_dir=working_dir,
+            exec_root=_EXEC_ROOT,
+            working_dir=_WORKING_DIR,
             inputs=[Path(input_file)],
             output_files=[Path(output)],
         )
@@ -3148,155 +3146,55 @@ remote_metadata: {{
         mock_downloader.assert_called_once_with()
         mock_download.assert_called_once()
 
-    def test_no_download_stubs_for_local_execution(self) -> None:
-        exec_root = Path("/home/project")
-        build_dir = Path("build-out")
-        working_dir = exec_root / build_dir
+    def _run_no_download_stubs_case(
+        self, exec_strategy: str, completion_status: str
+    ) -> None:
+        """Checks that no download stubs are made when the local result won."""
         download_option = "--download_outputs=false"
-        p = remote_action._MAIN_ARG_PARSER
         command = ["echo"]
         output = "out.out"
-        main_args, other = p.parse_known_args(
-            [download_option, "--exec_strategy=local", "--"] + command
+        main_args, other = remote_action._MAIN_ARG_PARSER.parse_known_args(
+            [download_option, f"--exec_strategy={exec_strategy}", "--"]
+            + command
         )
         action = remote_action.remote_action_from_args(
             main_args,
             remote_options=other,
-            exec_root=exec_root,
-            working_dir=working_dir,
+            exec_root=_EXEC_ROOT,
+            working_dir=_WORKING_DIR,
             output_files=[Path(output)],
         )
         self.assertEqual(action.local_only_command, command)
         self.assertFalse(action.download_outputs)
         self.assertEqual(action.expected_downloads, [])
-        options = action.options
-        self.assertIn(download_option, options)
+        self.assertIn(download_option, action.options)
         fake_log_record = FakeReproxyLogEntry(
-            completion_status="STATUS_LOCAL_EXECUTION"
+            completion_status=completion_status
+        )
+        exit_code, mocks = self._run_with_fake_log_record(
+            action, fake_log_record, mock_download_inputs=True
         )
-        with mock.patch.object(
-            remote_action.ReproxyLogEntry,
-            "parse_action_log",
-            return_value=fake_log_record,
-        ) as mock_parse_log:
-            with mock.patch.object(
-                remote_action.ReproxyLogEntry, "make_download_stubs"
-            ) as mock_stub:
-                with mock.patch.object(
-                    remote_action.RemoteAction,
-                    "download_inputs",
-                    return_value={},
-                ) as mock_download_inputs:
-                    with mock.patch.object(
-                        remote_action.RemoteAction,
-                        "_run_maybe_remotely",
-                        return_value=cl_utils.SubprocessResult(0),
-                    ) as mock_run:
-                        exit_code = action.run()
         self.assertEqual(exit_code, 0)
-        mock_run.assert_called()
-        mock_download_inputs.assert_called_once()
-        mock_parse_log.assert_called_with(Path(output + ".rrpl"))
-        mock_stub.assert_not_called()
+        mocks["_run_maybe_remotely"].assert_called()
+        mocks["download_inputs"].assert_called_once()
+        mocks["parse_action_log"].assert_called_with(Path(output + ".rrpl"))
+        mocks["make_download_stubs"].assert_not_called()
 
-    def test_no_download_stubs_for_racing_local_win(self) -> None:
-        exec_root = Path("/home/project")
-        build_dir = Path("build-out")
-        working_dir = exec_root / build_dir
-        download_option = "--download_outputs=false"
-        p = remote_action._MAIN_ARG_PARSER
-        command = ["echo"]
-        output = "out.out"
-        main_args, other = p.parse_known_args(
-            [download_option, "--exec_strategy=racing", "--"] + command
-        )
-        action = remote_action.remote_action_from_args(
-            main_args,
-            remote_options=other,
-            exec_root=exec_root,
-            working_dir=working_dir,
-            output_files=[Path(output)],
+    def test_no_download_stubs_for_local_execution(self) -> None:
+        self._run_no_download_stubs_case(
+            exec_strategy="local", completion_status="STATUS_LOCAL_EXECUTION"
         )
-        self.assertEqual(action.local_only_command, command)
-        self.assertFalse(action.download_outputs)
-        self.assertEqual(action.expected_downloads, [])
-        options = action.options
-        self.assertIn(download_option, options)
-        fake_log_record = FakeReproxyLogEntry(
-            completion_status="STATUS_RACING_LOCAL"
+
+    def test_no_download_stubs_for_racing_local_win(self) -> None:
+        self._run_no_download_stubs_case(
+            exec_strategy="racing", completion_status="STATUS_RACING_LOCAL"
         )
-        with mock.patch.object(
-            remote_action.ReproxyLogEntry,
-            "parse_action_log",
-            return_value=fake_log_record,
-        ) as mock_parse_log:
-            with mock.patch.object(
-                remote_action.RemoteAction, "download_inputs", return_value={}
-            ) as mock_download_inputs:
-                with mock.patch.object(
-                    remote_action.ReproxyLogEntry, "make_download_stubs"
-                ) as mock_stub:
-                    with mock.patch.object(
-                        remote_action.RemoteAction,
-                        "_run_maybe_remotely",
-                        return_value=cl_utils.SubprocessResult(0),
-                    ) as mock_run:
-                        exit_code = action.run()
-        self.assertEqual(exit_code, 0)
-        mock_run.assert_called()
-        mock_download_inputs.assert_called_once()
-        mock_parse_log.assert_called_with(Path(output + ".rrpl"))
-        mock_stub.assert_not_called()
 
     def test_no_download_stubs_for_local_fallback(self) -> None:
-        exec_root = Path("/home/project")
-        build_dir = Path("build-out")
-        working_dir = exec_root / build_dir
-        download_option = "--download_outputs=false"
-        p = remote_action._MAIN_ARG_PARSER
-        command = ["echo"]
-        output = "out.out"
-        main_args, other = p.parse_known_args(
-            [download_option, "--exec_strategy=remote_local_fallback", "--"]
-            + command
-        )
-        action = remote_action.remote_action_from_args(
-            main_args,
-            remote_options=other,
-            exec_root=exec_root,
-            working_dir=working_dir,
-            output_files=[Path(output)],
-        )
-        self.assertEqual(action.local_only_command, command)
-        self.assertFalse(action.download_outputs)
-        self.assertEqual(action.expected_downloads, [])
-        options = action.options
-        self.assertIn(download_option, options)
-        fake_log_record = FakeReproxyLogEntry(
-            completion_status="STATUS_LOCAL_FALLBACK"
+        self._run_no_download_stubs_case(
+            exec_strategy="remote_local_fallback",
+            completion_status="STATUS_LOCAL_FALLBACK",
         )
-        with mock.patch.object(
-            remote_action.ReproxyLogEntry,
-            "parse_action_log",
-            return_value=fake_log_record,
-        ) as mock_parse_log:
-            with mock.patch.object(
-                remote_action.RemoteAction, "download_inputs", return_value={}
-            ) as mock_download_inputs:
-                with mock.patch.object(
-                    remote_action.ReproxyLogEntry, "make_download_stubs"
-                ) as mock_stub:
-                    with mock.patch.object(
-                        remote_action.RemoteAction,
-                        "_run_maybe_remotely",
-                        return_value=cl_utils.SubprocessResult(0),
-                    ) as mock_run:
-                        exit_code = action.run()
-        self.assertEqual(exit_code, 0)
-        mock_run.assert_called()
-        mock_download_inputs.assert_called_once()
-        mock_parse_log.assert_called_with(Path(output + ".rrpl"))
-        mock_stub.assert_not_called()
 
     def _setup_update_stub_test(
         self, tdp: Path, output_contents: str | None = None
@@ -3304,17 +3202,12 @@ remote_metadata: {{
         exec_root = tdp
         build_dir = Path("build-out")
         self.working_dir = exec_root / build_dir
-        download_option = "--download_outputs=false"
-        p = remote_action._MAIN_ARG_PARSER
-        command = ["echo"]
+        download_option = _UPDATE_STUB_DOWNLOAD_OPTION
+        command = _UPDATE_STUB_COMMAND
         self.output = Path("out.out")
-        main_args, other = p.parse_known_args(
-            [download_option, "--preserve_unchanged_output_mtime", "--"]
-            + command
-        )
         action = remote_action.remote_action_from_args(
-            main_args,
-            remote_options=other,
+            self._update_stub_main_args,
+            remote_options=self._update_stub_remote_options,
             exec_root=exec_root,
             working_dir=self.working_dir,
             output_files=[self.output],
@@ -3343,195 +3236,202 @@ remote_metadata: {{
         )
         return action, fake_log_record
 
+    def _update_stub_with_mocks(
+        self,
+        action: remote_action.RemoteAction,
+        stub_info: remote_action.DownloadStubInfo,
+    ) -> Tuple[mock.MagicMock, mock.MagicMock]:
+        """Calls action._update_stub() without writing stubs or removing files.
+
+        Returns:
+          mocks for DownloadStubInfo.create and Path.unlink.
+        """
+        with mock.patch.object(
+            remote_action.DownloadStubInfo, "create"
+        ) as mock_create_stub:
+            with mock.patch.object(Path, "unlink") as mock_remove:
+                action._update_stub(stub_info)
+        return mock_create_stub, mock_remove
+
     def test_update_stub_preserve_unchanged_output_mtime_existing_stub_matches_digest(
         self,
     ) -> None:
-        with tempfile.TemporaryDirectory() as td:
-            action, fake_log_record = self._setup_update_stub_test(Path(td))
+        td = _scratch_dir(self.id())
+        action, fake_log_record = self._setup_update_stub_test(td)
 
-            # create a pre-existing stub-file with the same digest as the new output
-            assert fake_log_record is not None
-            old_stub_info = fake_log_record.make_download_stub_info(
-                self.output, build_id="new-build-id"
-            )
-            assert old_stub_info is not None
-            old_stub_info.create(self.working_dir)
-            self.assertTrue(
-                remote_action.is_download_stub_file(
-                    self.working_dir / old_stub_info.path
-                )
+        # create a pre-existing stub-file with the same digest as the new output
+        assert fake_log_record is not None
+        old_stub_info = fake_log_record.make_download_stub_info(
+            self.output, build_id="new-build-id"
+        )
+        assert old_stub_info is not None
+        old_stub_info.create(self.working_dir)
+        self.assertTrue(
+            remote_action.is_download_stub_file(
+                self.working_dir / old_stub_info.path
             )
+        )
 
-            # bypass the remote action running
-            with mock.patch.object(
-                remote_action.DownloadStubInfo, "create"
-            ) as mock_create_stub:
-                action._update_stub(old_stub_info)
+        mock_create_stub, mock_remove = self._update_stub_with_mocks(
+            action, old_stub_info
+        )
 
-            mock_create_stub.assert_not_called()
+        mock_remove.assert_not_called()  # existing stubs are never removed
+        mock_create_stub.assert_not_called()
 
     def test_update_stub_preserve_unchanged_output_mtime_existing_stub_mismatches_digest(
         self,
     ) -> None:
-        with tempfile.TemporaryDirectory() as td:
-            action, fake_log_record = self._setup_update_stub_test(Path(td))
-            # create a pre-existing stub-file with a different digest as the new output
-            old_stub_info = fake_log_record.make_download_stub_info(
-                self.output, build_id="new-build-id"
-            )
-            assert old_stub_info is not None
-            new_stub_info = copy.deepcopy(old_stub_info)
-            old_stub_info._blob_digest = "66776677/33"  # mismatched digest
-            old_stub_info.create(self.working_dir)
-            self.assertTrue(
-                remote_action.is_download_stub_file(
-                    self.working_dir / old_stub_info.path
-                )
+        td = _scratch_dir(self.id())
+        action, fake_log_record = self._setup_update_stub_test(td)
+        # create a pre-existing stub-file with a different digest as the new output
+        old_stub_info = fake_log_record.make_download_stub_info(
+            self.output, build_id="new-build-id"
+        )
+        assert old_stub_info is not None
+        # A separate, equal stub info, made the same way as the old one.
+        new_stub_info = fake_log_record.make_download_stub_info(
+            self.output, build_id="new-build-id"
+        )
+        assert new_stub_info is not None
+        old_stub_info._blob_digest = "66776677/33"  # mismatched digest
+        old_stub_info.create(self.working_dir)
+        self.assertTrue(
+            remote_action.is_download_stub_file(
+                self.working_dir / old_stub_info.path
             )
+        )
 
-            # bypass the remote action running
-            with mock.patch.object(
-                remote_action.DownloadStubInfo, "create"
-            ) as mock_create_stub:
-                action._update_stub(new_stub_info)
+        mock_create_stub, mock_remove = self._update_stub_with_mocks(
+            action, new_stub_info
+        )
 
-            mock_create_stub.assert_called_with(self.working_dir)
+        mock_remove.assert_not_called()  # existing stubs are never removed
+        mock_create_stub.assert_called_with(self.working_dir)
 
     def test_update_stub_preserve_unchanged_output_mtime_existing_file_matches_digest_with_backup_stub(
         self,
     ) -> None:
-        with tempfile.TemporaryDirectory() as td:
-            action, fake_log_record = self._setup_update_stub_test(
-                Path(td), output_contents="h3llo"
-            )
+        td = _scratch_dir(self.id())
+        action, fake_log_record = self._setup_update_stub_test(
+            td, output_contents="h3llo"
+        )
 
-            # pre-existing output file's digest matches that from the remote
-            # action, along with its backup download stub.
-            stub_location = remote_action.download_stub_backup_location(
-                self.output
-            )
-            old_stub_info = fake_log_record.make_download_stub_info(
-                self.output, build_id="new-build-id"
-            )
-            assert old_stub_info is not None
-            old_stub_info.create(self.working_dir, dest=stub_location)
-            self.assertTrue(
-                remote_action.is_download_stub_file(
-                    self.working_dir / stub_location
-                )
+        # pre-existing output file's digest matches that from the remote
+        # action, along with its backup download stub.
+        stub_location = remote_action.download_stub_backup_location(self.output)
+        old_stub_info = fake_log_record.make_download_stub_info(
+            self.output, build_id="new-build-id"
+        )
+        assert old_stub_info is not None
+        old_stub_info.create(self.working_dir, dest=stub_location)
+        self.assertTrue(
+            remote_action.is_download_stub_file(
+                self.working_dir / stub_location
             )
+        )
 
-            # bypass the remote action running
-            with mock.patch.object(
-                remote_action.DownloadStubInfo, "create"
-            ) as mock_create_stub:
-                with mock.patch.object(Path, "unlink") as mock_remove:
-                    action._update_stub(old_stub_info)
+        mock_create_stub, mock_remove = self._update_stub_with_mocks(
+            action, old_stub_info
+        )
 
-            # old file (and its stub) are left untouched
-            mock_remove.assert_not_called()
-            mock_create_stub.assert_not_called()
+        # old file (and its stub) are left untouched
+        mock_remove.assert_not_called()
+        mock_create_stub.assert_not_called()
 
     def test_update_stub_preserve_unchanged_output_mtime_existing_file_matches_digest_without_backup_stub(
         self,
     ) -> None:
-        with tempfile.TemporaryDirectory() as td:
-            action, fake_log_record = self._setup_update_stub_test(
-                Path(td), output_contents="h3llo"
-            )
+        td = _scratch_dir(self.id())
+        action, fake_log_record = self._setup_update_stub_test(
+            td, output_contents="h3llo"
+        )
 
-            # pre-existing output file's digest matches that from the remote
-            # action, without backup download stub.
-            old_stub_info = fake_log_record.make_download_stub_info(
-                self.output, build_id="new-build-id"
-            )
-            assert old_stub_info is not None
+        # pre-existing output file's digest matches that from the remote
+        # action, without backup download stub.
+        old_stub_info = fake_log_record.make_download_stub_info(
+            self.output, build_id="new-build-id"
+        )
+        assert old_stub_info is not None
 
-            # bypass the remote action running
-            with mock.patch.object(
-                remote_action.DownloadStubInfo, "create"
-            ) as mock_create_stub:
-                with mock.patch.object(Path, "unlink") as mock_remove:
-                    action._update_stub(old_stub_info)
+        mock_create_stub, mock_remove = self._update_stub_with_mocks(
+            action, old_stub_info
+        )
 
-            # old file is left untouched
-            mock_remove.assert_not_called()
-            mock_create_stub.assert_not_called()
+        # old file is left untouched
+        mock_remove.assert_not_called()
+        mock_create_stub.assert_not_called()
 
     def test_make_download_stub_info_not_found(self) -> None:
-        with tempfile.TemporaryDirectory() as td:
-            action, fake_log_record = self._setup_update_stub_test(
-                Path(td), output_contents="h3llo"
-            )
-            # Reference some path that is not among the recorded
-            # output file/directory digests.
-            stub_info = fake_log_record.make_download_stub_info(
-                Path("some/optional/output"), build_id="new-build-id"
-            )
-            self.assertIsNone(stub_info)
+        td = _scratch_dir(self.id())
+        action, fake_log_record = self._setup_update_stub_test(
+            td, output_contents="h3llo"
+        )
+        # Reference some path that is not among the recorded
+        # output file/directory digests.
+        stub_info = fake_log_record.make_download_stub_info(
+            Path("some/optional/output"), build_id="new-build-id"
+        )
+        self.assertIsNone(stub_info)
 
     def test_update_stub_preserve_unchanged_output_mtime_existing_file_mismatches_digest_with_backup_stub(
         self,
     ) -> None:
-        with tempfile.TemporaryDirectory() as td:
-            action, fake_log_record = self._setup_update_stub_test(
-                Path(td), output_contents="h3llo"
-            )
+        td = _scratch_dir(self.id())
+        action, fake_log_record = self._setup_update_stub_test(
+            td, output_contents="h3llo"
+        )
 
-            # pre-existing output file's digest does not match that from the
-            # remote action.
-            stub_location = remote_action.download_stub_backup_location(
-                self.output
-            )
-            old_stub_info = fake_log_record.make_download_stub_info(
-                self.output, build_id="new-build-id"
-            )
-            assert old_stub_info is not None
-            new_stub_info = copy.deepcopy(old_stub_info)
-            old_stub_info.create(self.working_dir, dest=stub_location)
-            new_stub_info._blob_digest = "43218765/11"  # mismatched digest
-            self.assertTrue(
-                remote_action.is_download_stub_file(
-                    self.working_dir / stub_location
-                )
+        # pre-existing output file's digest does not match that from the
+        # remote action.
+        stub_location = remote_action.download_stub_backup_location(self.output)
+        old_stub_info = fake_log_record.make_download_stub_info(
+            self.output, build_id="new-build-id"
+        )
+        assert old_stub_info is not None
+        # A separate, equal stub info, made the same way as the old one.
+        new_stub_info = fake_log_record.make_download_stub_info(
+            self.output, build_id="new-build-id"
+        )
+        assert new_stub_info is not None
+        old_stub_info.create(self.working_dir, dest=stub_location)
+        new_stub_info._blob_digest = "43218765/11"  # mismatched digest
+        self.assertTrue(
+            remote_action.is_download_stub_file(
+                self.working_dir / stub_location
             )
+        )
 
-            # bypass the remote action running
-            with mock.patch.object(
-                remote_action.DownloadStubInfo, "create"
-            ) as mock_create_stub:
-                with mock.patch.object(Path, "unlink") as mock_remove:
-                    action._update_stub(new_stub_info)
+        mock_create_stub, mock_remove = self._update_stub_with_mocks(
+            action, new_stub_info
+        )
 
-            # old file is replaced with new stub, old stub is removed
-            mock_remove.assert_called_with()
-            mock_create_stub.assert_called_with(self.working_dir)
+        # old file is replaced with new stub, old stub is removed
+        mock_remove.assert_called_with()
+        mock_create_stub.assert_called_with(self.working_dir)
 
     def test_update_stub_preserve_unchanged_output_mtime_existing_file_mismatches_digest_without_backup_stub(
         self,
     ) -> None:
-        with tempfile.TemporaryDirectory() as td:
-            action, fake_log_record = self._setup_update_stub_test(
-                Path(td), output_contents="h3llo"
-            )
-            # pre-existing output file's digest does not match that from the
-            # remote action.
-            new_stub_info = fake_log_record.make_download_stub_info(
-                self.output, build_id="new-build-id"
-            )
-            assert new_stub_info is not None
-            new_stub_info._blob_digest = "43218765/11"  # mismatched digest
+        td = _scratch_dir(self.id())
+        action, fake_log_record = self._setup_update_stub_test(
+            td, output_contents="h3llo"
+        )
+        # pre-existing output file's digest does not match that from the
+        # remote action.
+        new_stub_info = fake_log_record.make_download_stub_info(
+            self.output, build_id="new-build-id"
+        )
+        assert new_stub_info is not None
+        new_stub_info._blob_digest = "43218765/11"  # mismatched digest
 
-            # bypass the remote action running
-            with mock.patch.object(
-                remote_action.DownloadStubInfo, "create"
-            ) as mock_create_stub:
-                with mock.patch.object(Path, "unlink") as mock_remove:
-                    action._update_stub(new_stub_info)
+        mock_create_stub, mock_remove = self._update_stub_with_mocks(
+            action, new_stub_info
+        )
 
-            # old file is replaced with new stub
-            mock_remove.assert_called_with()
-            mock_create_stub.assert_called_with(self.working_dir)
+        # old file is replaced with new stub
+        mock_remove.assert_called_with()
+        mock_create_stub.assert_called_with(self.working_dir)
 
 
 class RbeDiagnosticsTests(unittest.TestCase):
@@ -3592,11 +3492,7 @@ class RbeDiagnosticsTests(unittest.TestCase):
     def test_not_analyzing_on_success(self) -> None:
         action = self._make_remote_action(diagnose_nonzero=True)
 
-        with mock.patch.object(
-            remote_action.RemoteAction,
-            "_run_maybe_remotely",
-            return_value=cl_utils.SubprocessResult(0),
-        ) as mock_run:
+        with _patch_run_maybe_remotely() as mock_run:
             with mock.patch.object(
                 remote_action.RemoteAction, "_cleanup"
             ) as mock_cleanup:
@@ -3636,48 +3532,45 @@ class RbeDiagnosticsTests(unittest.TestCase):
         mock_run.assert_called_once()
         mock_analyze.assert_not_called()
 
-    def test_analyze_flow(self) -> None:
+    @mock.patch.object(
+        remote_action,
+        "_reproxy_log_dir",
+        return_value="/path/to/tmp/reproxy.999999",
+    )
+    @mock.patch.object(
+        remote_action,
+        "_rewrapper_log_dir",
+        return_value="/path/to/tmp/reproxy.999999/wrapper/logz",
+    )
+    @mock.patch.object(Path, "is_file", return_value=True)
+    def test_analyze_flow(
+        self,
+        *unused_mocks: mock.MagicMock,
+    ) -> None:
         pid = 6789
         action_log = Path("obj/my_action.rrpl")
         fake_rewrapper_logs = [
             f"/noisy/log/rewrapper.where.who.log.INFO.when.{pid}",
             f"/noisy/log/rewrapper.where.who.log.ERROR.when.{pid}",
         ]
-        unnamed_mocks = [
-            mock.patch.object(
-                remote_action,
-                "_reproxy_log_dir",
-                return_value="/path/to/tmp/reproxy.999999",
-            ),
-            mock.patch.object(
-                remote_action,
-                "_rewrapper_log_dir",
-                return_value="/path/to/tmp/reproxy.999999/wrapper/logz",
-            ),
-            mock.patch.object(Path, "is_file", return_value=True),
-        ]
-        with contextlib.ExitStack() as stack:
-            for m in unnamed_mocks:
-                stack.enter_context(m)
-
+        with mock.patch.object(
+            Path, "glob", return_value=fake_rewrapper_logs
+        ) as mock_glob:
             with mock.patch.object(
-                Path, "glob", return_value=fake_rewrapper_logs
-            ) as mock_glob:
+                remote_action.ReproxyLogEntry, "parse_action_log"
+            ) as mock_parse_action_log:
                 with mock.patch.object(
-                    remote_action.ReproxyLogEntry, "parse_action_log"
-                ) as mock_parse_action_log:
+                    remote_action,
+                    "_file_lines_matching",
+                    return_value=["this is interesting"],
+                ) as mock_read_log:
                     with mock.patch.object(
-                        remote_action,
-                        "_file_lines_matching",
-                        return_value=["this is interesting"],
-                    ) as mock_read_log:
-                        with mock.patch.object(
-                            remote_action, "_diagnose_reproxy_error_line"
-                        ) as mock_diagnose_line:
-                            remote_action.analyze_rbe_logs(
-                                rewrapper_pid=pid,
-                                action_log=action_log,
-                            )
+                        remote_action, "_diagnose_reproxy_error_line"
+                    ) as mock_diagnose_line:
+                        remote_action.analyze_rbe_logs(
+                            rewrapper_pid=pid,
+                            action_log=action_log,
+                        )
         mock_glob.assert_called_once()
         mock_read_log.assert_called_once()
         mock_parse_action_log.assert_called_with(action_log)
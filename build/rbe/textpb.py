@@ -39,55 +39,53 @@ _VALUE_RE = re.compile(r"[^ \t\r\n]+")  # Anything text that is not space
 
 
 def _lex_line(line: str) -> Iterable[Token]:
-    while line:  # is not empty
-        next_char = line[0]
+    # Scan with a cursor instead of re-slicing the remaining text per token.
+    pos = 0
+    end = len(line)
+    while pos < end:
+        next_char = line[pos]
 
         if next_char in {"<", "{"}:
             yield Token(text=next_char, type=TokenType.START_BLOCK)
-            line = line[1:]
+            pos += 1
             continue
 
         if next_char in {">", "}"}:
             yield Token(text=next_char, type=TokenType.END_BLOCK)
-            line = line[1:]
+            pos += 1
             continue
 
-        field_match = _FIELD_NAME_RE.match(line)
+        field_match = _FIELD_NAME_RE.match(line, pos)
         if field_match:
-            field_name = field_match.group(0)
-            yield Token(text=field_name, type=TokenType.FIELD_NAME)
-            line = line[len(field_name) :]
+            yield Token(text=field_match.group(0), type=TokenType.FIELD_NAME)
+            pos = field_match.end()
             continue
 
-        string_match = _STRING_RE.match(line)
+        string_match = _STRING_RE.match(line, pos)
         if string_match:
-            string = string_match.group(0)
-            yield Token(text=string, type=TokenType.STRING_VALUE)
-            line = line[len(string) :]
+            yield Token(text=string_match.group(0), type=TokenType.STRING_VALUE)
+            pos = string_match.end()
             continue
 
-        value_match = _VALUE_RE.match(line)
+        value_match = _VALUE_RE.match(line, pos)
         if value_match:
-            value = value_match.group(0)
-            yield Token(text=value, type=TokenType.OTHER_VALUE)
-            line = line[len(value) :]
+            yield Token(text=value_match.group(0), type=TokenType.OTHER_VALUE)
+            pos = value_match.end()
             continue
 
-        space_match = _SPACE_RE.match(line)
+        space_match = _SPACE_RE.match(line, pos)
         if space_match:
-            space = space_match.group(0)
-            yield Token(text=space, type=TokenType.SPACE)
-            line = line[len(space) :]
+            yield Token(text=space_match.group(0), type=TokenType.SPACE)
+            pos = space_match.end()
             continue
 
-        newline_match = _NEWLINE_RE.match(line)
+        newline_match = _NEWLINE_RE.match(line, pos)
         if newline_match:
-            newline = newline_match.group(0)
-            yield Token(text=newline, type=TokenType.NEWLINE)
-            line = line[len(newline) :]
+            yield Token(text=newline_match.group(0), type=TokenType.NEWLINE)
+            pos = newline_match.end()
             continue
 
-        raise ValueError(f'[textpb.lex] Unrecognized text: "{line}"')
+        raise ValueError(f'[textpb.lex] Unrecognized text: "{line[pos:]}"')
 
 
 def yield_verbose(items: Iterable[Any]) -> Iterable[Any]: